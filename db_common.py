@@ -0,0 +1,37 @@
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator
+
+# 스키마 생성/데이터 입력 스크립트의 모든 연결에 적용하는 설정
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",  # 커밋마다 롤백 저널을 만들고 지우지 않음, 쓰는 중에도 다른 연결이 읽을 수 있음
+    "PRAGMA synchronous=NORMAL",  # WAL에서는 커밋마다 fsync하지 않고 체크포인트 때만 함
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=5000",  # 다른 연결이 쓰는 중이면 바로 실패하지 않고 최대 5초 대기
+]
+
+def open_db(db_name: str = "combined_products.db") -> sqlite3.Connection:
+    """설정(PRAGMA)을 적용한 데이터베이스 연결을 반환합니다."""
+    # sqlite3의 문장 캐시는 SQL 텍스트로 찾으므로 같은 문장을 다시 실행하면 컴파일을 건너뜀
+    # (스크립트들이 쓰는 문장은 기본값 128개로도 다 들어가지만, 밀려나지 않도록 여유를 둠)
+    conn = sqlite3.connect(db_name, cached_statements=256)
+    for pragma_sql in CONNECTION_PRAGMAS:
+        conn.execute(pragma_sql)
+    return conn
+
+@contextmanager
+def txn(db_name: str = "combined_products.db", immediate: bool = False) -> Iterator[sqlite3.Cursor]:
+    """open_db로 연결을 열고 하나의 트랜잭션(BEGIN…COMMIT) 안에서 쓸 커서를 넘겨줍니다.
+    블록이 예외로 끝나면 전체를 롤백하고, 어느 경우든 연결을 닫습니다.
+    immediate면 시작할 때 쓰기 잠금을 잡아, 먼저 읽고 나중에 쓰는 도중 다른 연결에 밀려 실패하지 않습니다."""
+    conn = open_db(db_name)
+    try:
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        yield conn.cursor()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
@@ -1,126 +1,171 @@
+import atexit
+import functools
+import os
 import sqlite3
-import pandas as pd
+from typing import Dict, List, Optional, Tuple
 
-def get_db_connection():
-    return sqlite3.connect("combined_products.db")
+# 조회 쿼리의 조인/정렬 컬럼용 인덱스 (CombinedProductServicePlan은 기본 키가 이미 (combined_product_id, service_plan_id)임)
+INDEX_SQL_LIST = [
+    "CREATE INDEX IF NOT EXISTS idx_disc_cpid ON Discount(combined_product_id, plan_id, discount_value)",
+    "CREATE INDEX IF NOT EXISTS idx_sp_type_fee ON ServicePlan(service_type, fee DESC)",
+]
 
-def fetch_top_discount_total_product():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT
-            cp.id,
-            cp.name,
-            SUM(d.discount_value) AS total_discount
-        FROM CombinedProduct cp
-        JOIN Discount d ON cp.id = d.combined_product_id
-        GROUP BY cp.id
-        ORDER BY total_discount DESC
-        LIMIT 1
-    """)
-    top = cursor.fetchone()
-    if not top:
-        return None, []
+# 모듈 전역에서 공유하는 연결 (DB 파일 경로별로 최초 호출 시에만 연결하고, 프로세스 종료 시 닫음)
+_CONNS: Dict[str, sqlite3.Connection] = {}
 
-    cp_id, name, total_discount = top
-    # 할인된 요금제들만 가져오기
-    cursor.execute("""
-        SELECT sp.name, sp.fee
-        FROM Discount d
-        JOIN ServicePlan sp ON d.plan_id = sp.id
-        WHERE d.combined_product_id = ?
-    """, (cp_id,))
-    plans = cursor.fetchall()
-    conn.close()
-    return {"product_name": name, "total_discount": total_discount}, plans
+def _open_connection(db_name: str):
+    conn = sqlite3.connect(db_name, check_same_thread=False, cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-32000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    atexit.register(conn.close)
+    return conn
 
-def fetch_cheapest_final_price_product():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT
-            cp.id,
-            cp.name,
-            SUM(sp.fee) - IFNULL(SUM(d.discount_value), 0) AS final_price
-        FROM CombinedProduct cp
-        JOIN CombinedProductServicePlan cpsp ON cp.id = cpsp.combined_product_id
-        JOIN ServicePlan sp ON cpsp.service_plan_id = sp.id
-        LEFT JOIN Discount d ON d.plan_id = sp.id AND d.combined_product_id = cp.id
-        GROUP BY cp.id
-        ORDER BY final_price ASC
-        LIMIT 1
-    """)
-    top = cursor.fetchone()
-    if not top:
-        return None, []
+def get_db_connection(db_name: str = "combined_products.db"):
+    db_path = os.path.abspath(db_name)
+    conn = _CONNS.get(db_path)
+    if conn is None:
+        conn = _CONNS[db_path] = _open_connection(db_path)
+        for index_sql in INDEX_SQL_LIST:
+            conn.execute(index_sql)
+        conn.commit()
+    return conn
 
-    cp_id, name, final_price = top
-    # 할인 적용된 요금제들만 가져오기
-    cursor.execute("""
-        SELECT sp.name, sp.fee
+# 반복 실행되는 조회 SQL (동일한 SQL 문자열을 재사용하므로 sqlite3 문장 캐시에서 컴파일된 문장을 꺼내 씀)
+# 세 기준(할인 총액 최대 / 할인 후 최저가 / 원가 최고가)의 1위와 각 1위 상품의 요금제 목록을 한 번의 조회로 가져옴
+# - winners: 기준별 1위 (각 부분은 ORDER BY ... LIMIT 1을 쓰기 위해 서브쿼리로 감쌈)
+# - 할인 기준은 할인된 요금제(할인 등록 순), 원가 기준은 연결된 전체 요금제를 붙임
+# - 할인 후 최저가: 연결된 요금제의 요금 합(base)과 연결된 요금제에 대한 할인 합(disc)을 상품별로 따로 집계한 뒤 뺌
+#   (요금제와 할인을 먼저 조인하면 한 요금제에 할인 행이 여러 개일 때 요금이 중복 합산됨)
+#   할인이 없는 상품도 있으므로 disc는 LEFT JOIN
+# - 요금제가 없는 1위 상품도 남도록 LEFT JOIN (이때 요금제 이름은 NULL)
+SQL_CATEGORY_WINNERS_WITH_PLANS = """
+    WITH winners AS (
+        SELECT * FROM (
+            SELECT
+                1 AS category_order,
+                'total_discount' AS category,
+                cp.id,
+                cp.name,
+                SUM(d.discount_value) AS value
+            FROM CombinedProduct cp
+            JOIN Discount d ON cp.id = d.combined_product_id
+            GROUP BY cp.id
+            ORDER BY value DESC
+            LIMIT 1
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT
+                2 AS category_order,
+                'final_price' AS category,
+                cp.id,
+                cp.name,
+                base.fee - IFNULL(disc.discount_value, 0) AS value
+            FROM CombinedProduct cp
+            JOIN (
+                SELECT cpsp.combined_product_id, SUM(sp.fee) AS fee
+                FROM CombinedProductServicePlan cpsp
+                JOIN ServicePlan sp ON cpsp.service_plan_id = sp.id
+                GROUP BY cpsp.combined_product_id
+            ) base ON base.combined_product_id = cp.id
+            LEFT JOIN (
+                SELECT d.combined_product_id, SUM(d.discount_value) AS discount_value
+                FROM Discount d
+                JOIN CombinedProductServicePlan cpsp
+                    ON cpsp.combined_product_id = d.combined_product_id AND cpsp.service_plan_id = d.plan_id
+                JOIN ServicePlan sp ON d.plan_id = sp.id
+                GROUP BY d.combined_product_id
+            ) disc ON disc.combined_product_id = cp.id
+            ORDER BY value ASC
+            LIMIT 1
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT
+                3 AS category_order,
+                'original_price' AS category,
+                cp.id,
+                cp.name,
+                SUM(sp.fee) AS value
+            FROM CombinedProduct cp
+            JOIN CombinedProductServicePlan cpsp ON cp.id = cpsp.combined_product_id
+            JOIN ServicePlan sp ON cpsp.service_plan_id = sp.id
+            GROUP BY cp.id
+            ORDER BY value DESC
+            LIMIT 1
+        )
+    ),
+    discounted_plans AS (
+        SELECT d.combined_product_id, d.rowid AS plan_order, sp.name
         FROM Discount d
         JOIN ServicePlan sp ON d.plan_id = sp.id
-        WHERE d.combined_product_id = ?
-    """, (cp_id,))
-    plans = cursor.fetchall()
-    conn.close()
-    return {"product_name": name, "final_price": final_price}, plans
-
-def fetch_most_expensive_original_price_product():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT
-            cp.id,
-            cp.name,
-            SUM(sp.fee) AS original_price
-        FROM CombinedProduct cp
-        JOIN CombinedProductServicePlan cpsp ON cp.id = cpsp.combined_product_id
-        JOIN ServicePlan sp ON cpsp.service_plan_id = sp.id
-        GROUP BY cp.id
-        ORDER BY original_price DESC
-        LIMIT 1
-    """)
-    top = cursor.fetchone()
-    if not top:
-        return None, []
-
-    cp_id, name, original_price = top
-    # 전체 연결된 요금제들 가져오기
-    cursor.execute("""
-        SELECT sp.name, sp.fee
+    ),
+    linked_plans AS (
+        SELECT cpsp.combined_product_id, cpsp.service_plan_id AS plan_order, sp.name
         FROM CombinedProductServicePlan cpsp
         JOIN ServicePlan sp ON cpsp.service_plan_id = sp.id
-        WHERE cpsp.combined_product_id = ?
-    """, (cp_id,))
-    plans = cursor.fetchall()
-    conn.close()
-    return {"product_name": name, "original_price": original_price}, plans
+    )
+    SELECT w.category_order, w.category, w.name, w.value, p.plan_order, p.name
+    FROM winners w
+    LEFT JOIN discounted_plans p ON p.combined_product_id = w.id
+    WHERE w.category IN ('total_discount', 'final_price')
+    UNION ALL
+    SELECT w.category_order, w.category, w.name, w.value, p.plan_order, p.name
+    FROM winners w
+    LEFT JOIN linked_plans p ON p.combined_product_id = w.id
+    WHERE w.category = 'original_price'
+    ORDER BY 1, 5
+"""
 
-# 실행 및 출력
-discount_info, discount_plans = fetch_top_discount_total_product()
-cheapest_info, cheapest_plans = fetch_cheapest_final_price_product()
-expensive_info, expensive_plans = fetch_most_expensive_original_price_product()
+# 결과 순서 (1위 상품이 없는 기준은 (None, [])로 채움)
+CATEGORIES = ("total_discount", "final_price", "original_price")
+
+def fetch_category_products(db_name: str = "combined_products.db"):
+    """{기준: (상품 정보, 요금제 이름 목록)} 형태로 세 기준의 1위 결합상품을 반환합니다."""
+    # data_version은 다른 연결이 DB에 커밋했을 때만 바뀌므로, DB 경로와 값이 같으면 캐시된 결과를 그대로 씀
+    db_path = os.path.abspath(db_name)
+    data_version = get_db_connection(db_path).execute("PRAGMA data_version").fetchone()[0]
+    # 캐시에는 변경할 수 없는 튜플만 두고, 호출마다 새 dict/list를 만들어 반환 (호출한 쪽이 고쳐도 캐시는 그대로)
+    return {
+        category: (
+            None if name is None else {"product_name": name, category: value},
+            list(plan_names),
+        )
+        for category, name, value, plan_names in _fetch_category_products(db_path, data_version)
+    }
 
-df = pd.DataFrame([
-    {
-        "유형": "할인 총액 최대",
-        "상품명": discount_info["product_name"],
-        "금액": discount_info["total_discount"],
-        "요금제 목록": ", ".join(name for name, _ in discount_plans)
-    },
-    {
-        "유형": "할인 후 최저가",
-        "상품명": cheapest_info["product_name"],
-        "금액": cheapest_info["final_price"],
-        "요금제 목록": ", ".join(name for name, _ in cheapest_plans)
-    },
-    {
-        "유형": "원가 최고가",
-        "상품명": expensive_info["product_name"],
-        "금액": expensive_info["original_price"],
-        "요금제 목록": ", ".join(name for name, _ in expensive_plans)
-    },
-])
+@functools.lru_cache(maxsize=32)
+def _fetch_category_products(db_path: str, data_version: int) -> Tuple[Tuple[str, Optional[str], Optional[int], Tuple[str, ...]], ...]:
+    conn = get_db_connection(db_path)
+    winners: Dict[str, Tuple[Optional[str], Optional[int], List[str]]] = {
+        category: (None, None, []) for category in CATEGORIES
+    }
+    for _order, category, name, value, _plan_order, plan_name in conn.execute(SQL_CATEGORY_WINNERS_WITH_PLANS):
+        if winners[category][0] is None:
+            winners[category] = (name, value, [])
+        if plan_name is not None:
+            winners[category][2].append(plan_name)
+    return tuple(
+        (category, name, value, tuple(plan_names))
+        for category, (name, value, plan_names) in winners.items()
+    )
+
+# 실행 및 출력
+if __name__ == "__main__":
+    category_products = fetch_category_products()
+    discount_info, discount_plans = category_products["total_discount"]
+    cheapest_info, cheapest_plans = category_products["final_price"]
+    expensive_info, expensive_plans = category_products["original_price"]
 
-print(df)
+    # 출력할 행이 3개뿐이라 pandas 없이 문자열로 바로 출력
+    rows = [
+        ("할인 총액 최대", discount_info["product_name"], discount_info["total_discount"], discount_plans),
+        ("할인 후 최저가", cheapest_info["product_name"], cheapest_info["final_price"], cheapest_plans),
+        ("원가 최고가", expensive_info["product_name"], expensive_info["original_price"], expensive_plans),
+    ]
+    for label, product_name, amount, plan_names in rows:
+        print(f"{label}: {product_name} ({amount}원)")
+        print(f"  요금제 목록: {', '.join(plan_names)}")
@@ -1,250 +1,454 @@
+import copy
+import functools
+import json
+import os
 import sqlite3
-import hashlib # hash_id 함수가 다른 파일에 있다면 필요 없음
+import threading
+import heapq
 import itertools
-from itertools import combinations, product, combinations_with_replacement
-from typing import List, Dict, Any, Optional, Tuple
+from collections import namedtuple
+from itertools import product, combinations_with_replacement
+from contextlib import contextmanager
+from typing import FrozenSet, Iterator, List, Dict, Any, Optional, Set, Tuple
+
+# 모든 연결에 적용하는 설정
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",  # 쓰기 중에도 다른 연결이 읽을 수 있고, 읽는 연결끼리도 서로 막지 않음
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+]
+
+def _apply_pragmas(conn: sqlite3.Connection) -> None:
+    for pragma_sql in CONNECTION_PRAGMAS:
+        conn.execute(pragma_sql)
 
 # db 연결
 def get_db_connection(db_name: str = "combined_products.db"):
     """데이터베이스 연결을 반환합니다."""
     conn = sqlite3.connect(db_name)
+    _apply_pragmas(conn)
     conn.row_factory = sqlite3.Row  # 컬럼 이름으로 데이터 접근 가능하게 설정
     return conn
 
-def classify_discount_type(cursor, discount_id: int) -> str:
-    """해당 discount_id의 조건이 요금제 기반인지, 회선 수 기반인지, 혼합인지 판단"""
-    cursor.execute("SELECT COUNT(*) FROM DiscountConditionByPlan WHERE discount_id = ?", (discount_id,))
-    plan_count = cursor.fetchone()[0]
-
-    cursor.execute("SELECT COUNT(*) FROM DiscountConditionByLineCount WHERE discount_id = ?", (discount_id,))
-    line_count = cursor.fetchone()[0]
+# 조회 경로에서 기본 키로 커버되지 않는 조인/필터 컬럼용 인덱스
+# (CombinedProductEligibility, DiscountConditionByPlan, DiscountConditionByLineCount는 기본 키의 선두 컬럼으로 이미 찾을 수 있음)
+INDEX_SQL_LIST = [
+    "CREATE INDEX IF NOT EXISTS idx_disc_cp ON Discount(combined_product_id)",
+]
+
+def _ensure_indexes(conn: sqlite3.Connection) -> None:
+    for index_sql in INDEX_SQL_LIST:
+        conn.execute(index_sql)
+    conn.commit()
+
+# db 경로별로 쉬고 있는 연결을 하나씩 보관 (연결을 매번 새로 열면 파일 열기/스키마 파싱을 반복하고 페이지 캐시도 버려짐)
+_POOL: Dict[str, sqlite3.Connection] = {}
+_POOL_LOCK = threading.Lock()
+
+def _open_pooled_connection(db_name: str) -> sqlite3.Connection:
+    # 문장 캐시는 SQL 텍스트로 찾으므로 반복되는 조회는 컴파일을 건너뜀 (조회 문장이 밀려나지 않도록 여유를 둠)
+    conn = sqlite3.connect(db_name, check_same_thread=False, cached_statements=256)
+    _apply_pragmas(conn)
+    _ensure_indexes(conn)
+    return conn
 
-    if plan_count > 0 and line_count > 0:
+@contextmanager
+def pooled_connection(db_name: str = "combined_products.db") -> Iterator[sqlite3.Connection]:
+    """풀에서 연결을 꺼내 쓰고, 블록이 끝나면 풀에 돌려놓습니다. (행은 튜플로 반환됨)"""
+    with _POOL_LOCK:
+        conn = _POOL.pop(db_name, None)
+    if conn is None:
+        conn = _open_pooled_connection(db_name)
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        with _POOL_LOCK:
+            # 다른 스레드가 먼저 돌려놓았으면 이 연결은 닫음
+            if db_name in _POOL:
+                conn.close()
+            else:
+                _POOL[db_name] = conn
+
+# service_type별로 요금제를 담을 결합 상품 정보의 키
+ASSOCIATED_PLANS_KEYS = {
+    "Mobile": "associated_mobile_plans",
+    "Internet": "associated_internet_plans",
+    "TV": "associated_tv_plans",
+}
+
+# (결합 상품, 요금제)별 할인액. 정액(KRW)은 그대로, 그 외(%)는 요금에 비율을 곱해 정수로 절사
+PLAN_DISCOUNT_VIEW_SQL = """
+    CREATE TEMP VIEW IF NOT EXISTS plan_discount AS
+    SELECT
+        d.combined_product_id,
+        dcbp.service_plan_id,
+        SUM(
+            CASE WHEN dcbp.override_unit = 'KRW' THEN dcbp.override_discount_value
+                 ELSE CAST(sp.fee * dcbp.override_discount_value / 100.0 AS INTEGER)
+            END
+        ) AS discount_amount
+    FROM Discount d
+    JOIN DiscountConditionByPlan dcbp ON dcbp.discount_id = d.id
+    JOIN ServicePlan sp ON sp.id = dcbp.service_plan_id
+    WHERE dcbp.override_discount_value IS NOT NULL
+    GROUP BY d.combined_product_id, dcbp.service_plan_id
+"""
+
+# 조건 테이블 두 곳의 존재 여부를 한 문장으로 확인 (호출마다 같은 준비된 문장을 재사용)
+SQL_DISCOUNT_CONDITION_FLAGS = """
+    SELECT
+        EXISTS (SELECT 1 FROM DiscountConditionByPlan WHERE discount_id = :id),
+        EXISTS (SELECT 1 FROM DiscountConditionByLineCount WHERE discount_id = :id)
+"""
+
+SQL_COMBINED_PRODUCT_CONDITION_FLAGS = """
+    SELECT
+        EXISTS (
+            SELECT 1 FROM Discount d
+            JOIN DiscountConditionByPlan p ON d.id = p.discount_id
+            WHERE d.combined_product_id = :id
+        ),
+        EXISTS (
+            SELECT 1 FROM Discount d
+            JOIN DiscountConditionByLineCount l ON d.id = l.discount_id
+            WHERE d.combined_product_id = :id
+        )
+"""
+
+# 검색용 요금제. 조합마다 참조되므로 dict보다 가볍고 속성 접근이 빠른 namedtuple로 보관하고,
+# 결과로 돌려줄 때만 dict로 바꿈 (필드 순서가 결과 dict의 키 순서)
+Plan = namedtuple("Plan", "id name fee service_type base_role")
+
+def _empty_plans_by_type() -> Dict[str, List[Plan]]:
+    """조합 생성에 쓰는 service_type별 빈 요금제 목록 (Mobile, Internet, TV 순서)"""
+    return {service_type: [] for service_type in ASSOCIATED_PLANS_KEYS}
+
+# 여러 id의 조건 존재 여부를 한 번에 확인 (id 목록은 JSON 배열로 바인딩)
+SQL_DISCOUNT_CONDITION_FLAGS_BULK = """
+    SELECT
+        ids.value,
+        EXISTS (SELECT 1 FROM DiscountConditionByPlan WHERE discount_id = ids.value),
+        EXISTS (SELECT 1 FROM DiscountConditionByLineCount WHERE discount_id = ids.value)
+    FROM json_each(?) ids
+"""
+
+def _discount_type_from_flags(has_plan: int, has_line: int, default: str) -> str:
+    if has_plan and has_line:
         return "mixed"
-    elif plan_count > 0:
+    elif has_plan:
         return "plan_based"
-    elif line_count > 0:
+    elif has_line:
         return "line_based"
     else:
-        return "simple"
+        return default
 
-def inform_combined_product(db_name: str, combined_product_id: str) -> Optional[Dict[str, Any]]:
-    conn = get_db_connection(db_name)
-    cursor = conn.cursor()
-
-    # 1. 결합 상품 정보 조회
-    cursor.execute("""
-        SELECT 
-            cp.id, 
-            cp.name, 
-            cp.description, 
-            c.name as company_name, 
-            cp.max_mobile_lines, 
-            cp.max_internet_lines, 
-            cp.max_iptv_lines
-        FROM CombinedProduct cp
-        JOIN Company c ON cp.company_id = c.id
-        WHERE cp.id = ?
-    """, (combined_product_id,))
-    product_info = cursor.fetchone()
-
-    if not product_info:
-        conn.close()
-        return None
-
-    # 2. RequiredBaseRole 조회: 결합상품에 요구되는 base_role들
-    cursor.execute("""
-        SELECT base_role, required_count
-        FROM RequiredBaseRole
-        WHERE combined_product_id = ?
-    """, (combined_product_id,))
-    required_roles = cursor.fetchall()
-
-    base_roles_required = [
-        {"base_role": row["base_role"], "required_count": row["required_count"]}
-        for row in required_roles
-    ]
+def classify_discount_type(cursor, discount_id: int) -> str:
+    """해당 discount_id의 조건이 요금제 기반인지, 회선 수 기반인지, 혼합인지 판단"""
+    cursor.execute(SQL_DISCOUNT_CONDITION_FLAGS, {"id": discount_id})
+    has_plan, has_line = cursor.fetchone()
+    return _discount_type_from_flags(has_plan, has_line, "simple")
 
-    # 3. 결합 가능한 요금제 리스트 (서비스 타입별로)
-    associated_mobile_plans = []
-    associated_internet_plans = []
-    associated_tv_plans = []
-
-    cursor.execute("""
-        SELECT sp.name, sp.fee, sp.service_type, cpe.base_role as base_role
-        FROM ServicePlan sp
-        JOIN CombinedProductEligibility cpe ON sp.id = cpe.service_plan_id
-        WHERE cpe.combined_product_id = ?
-        ORDER BY sp.fee DESC
-    """, (combined_product_id,))
-    all_plans = cursor.fetchall()
-
-    for plan in all_plans:
-        plan_info = {
-            "name": plan["name"],
-            "fee": plan["fee"],
-            "service_type": plan["service_type"],
-            "base_role": plan["base_role"]
-        }
-        if plan["service_type"] == "Mobile":
-            associated_mobile_plans.append(plan_info)
-        elif plan["service_type"] == "Internet":
-            associated_internet_plans.append(plan_info)
-        elif plan["service_type"] == "TV":
-            associated_tv_plans.append(plan_info)
+def classify_discount_types(cursor, discount_ids: List[str]) -> Dict[str, str]:
+    """classify_discount_type을 여러 id에 대해 한 번의 조회로 수행합니다. {id: 유형}"""
+    cursor.execute(SQL_DISCOUNT_CONDITION_FLAGS_BULK, (json.dumps(discount_ids),))
+    return {
+        discount_id: _discount_type_from_flags(has_plan, has_line, "simple")
+        for discount_id, has_plan, has_line in cursor
+    }
 
-    conn.close()
+def inform_combined_product(db_name: str, combined_product_id: str) -> Optional[Dict[str, Any]]:
+    """결합 상품 하나의 정보를 반환합니다. 없으면 None."""
+    pricings = get_all_combined_product_pricings(db_name, [combined_product_id])
+    return pricings[0] if pricings else None
+
+
+def get_all_combined_product_pricings(db_name: str = "combined_products.db",
+                                      combined_product_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """모든 결합 상품(또는 combined_product_ids로 지정한 상품들)에 대해 정보를 반환합니다."""
+    ids_key = tuple(combined_product_ids) if combined_product_ids is not None else None
+    pricings = _get_cached_pricings(os.path.abspath(db_name), ids_key, _db_fingerprint(db_name))
+    # 캐시된 결과를 호출한 쪽에서 바꿔도 캐시가 오염되지 않도록 복사본을 반환
+    return copy.deepcopy(pricings)
+
+def _db_fingerprint(db_name: str) -> Tuple:
+    """DB 파일과 WAL 파일의 (수정 시각, 크기). 어느 연결이든 커밋하면 값이 바뀜"""
+    fingerprint = []
+    for path in (db_name, db_name + "-wal"):
+        try:
+            stat = os.stat(path)
+            fingerprint.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+@functools.lru_cache(maxsize=1024)
+def _get_cached_pricings(db_path: str, ids_key: Optional[Tuple[str, ...]], fingerprint: Tuple) -> List[Dict[str, Any]]:
+    # fingerprint는 캐시 키로만 쓰임 (DB가 바뀌면 키가 달라져 다시 조회)
+    with pooled_connection(db_path) as conn:
+        # 세 조회는 하나의 읽기 트랜잭션(같은 스냅샷)에서 실행
+        conn.execute("BEGIN")
+        all_pricings = _load_combined_product_pricings(conn, list(ids_key) if ids_key is not None else None)
+        conn.commit()
+    return all_pricings
 
+def _id_filtered_sql(template: str, id_column: str) -> Dict[bool, str]:
+    """{id 필터 사용 여부: SQL}. 두 SQL 문자열을 모듈 로드 시 한 번만 만들어 두고 같은 문자열을 재사용"""
     return {
-        "combined_product_id": product_info['id'],
-        "combined_product_name": product_info['name'],
-        "company_name": product_info['company_name'],
-        "required_base_roles": base_roles_required,
-        "associated_mobile_plans": associated_mobile_plans,
-        "associated_internet_plans": associated_internet_plans,
-        "associated_tv_plans": associated_tv_plans,
+        False: template.format(id_filter=""),
+        True: template.format(id_filter=f"WHERE {id_column} IN (SELECT value FROM json_each(?))"),
     }
 
-
-def get_all_combined_product_pricings(db_name: str = "combined_products.db") -> List[Dict[str, Any]]:
-    """모든 결합 상품에 대해 정보를 반환합니다."""
-    conn = get_db_connection(db_name)
+SQL_LOAD_PRODUCTS = _id_filtered_sql("""
+    SELECT
+        cp.id,
+        cp.name,
+        c.name as company_name
+    FROM CombinedProduct cp
+    JOIN Company c ON cp.company_id = c.id
+    {id_filter}
+    ORDER BY cp.id
+""", "cp.id")
+
+SQL_LOAD_REQUIRED_ROLES = _id_filtered_sql("""
+    SELECT combined_product_id, base_role, required_count
+    FROM RequiredBaseRole
+    {id_filter}
+    ORDER BY combined_product_id, base_role
+""", "combined_product_id")
+
+SQL_LOAD_ELIGIBLE_PLANS = _id_filtered_sql("""
+    SELECT cpe.combined_product_id, sp.name, sp.fee, sp.service_type, cpe.base_role as base_role
+    FROM ServicePlan sp
+    JOIN CombinedProductEligibility cpe ON sp.id = cpe.service_plan_id
+    {id_filter}
+    ORDER BY cpe.combined_product_id, sp.fee DESC
+""", "cpe.combined_product_id")
+
+def _load_combined_product_pricings(conn: sqlite3.Connection,
+                                    combined_product_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """이미 열린 연결에서 결합 상품 정보를 일괄 조회합니다. (row_factory와 무관하게 행을 언패킹해서 씀)"""
     cursor = conn.cursor()
 
-    cursor.execute("SELECT id FROM CombinedProduct")
-    product_ids = [row['id'] for row in cursor.fetchall()]
-    
+    # id 목록은 JSON 배열 하나로 바인딩하고 json_each로 펼침 (id 개수와 무관하게 같은 SQL, 파라미터 개수 제한 없음)
+    filtered = combined_product_ids is not None
+    params: Tuple = (json.dumps(combined_product_ids),) if filtered else ()
+
+    # 상품별로 따로 조회하지 않고, 테이블별로 한 번씩만 조회한 뒤 상품 id 기준으로 묶습니다.
+    # 1. 결합 상품 정보 일괄 조회
+    cursor.execute(SQL_LOAD_PRODUCTS[filtered], params)
+
     all_pricings = []
-    for product_id in product_ids:
-        pricing_data = inform_combined_product(db_name, product_id)
+    pricing_by_id: Dict[str, Dict[str, Any]] = {}
+    for combined_product_id, name, company_name in cursor:
+        pricing_data = {
+            "combined_product_id": combined_product_id,
+            "combined_product_name": name,
+            "company_name": company_name,
+            "required_base_roles": [],
+            "associated_mobile_plans": [],
+            "associated_internet_plans": [],
+            "associated_tv_plans": [],
+        }
+        all_pricings.append(pricing_data)
+        pricing_by_id[combined_product_id] = pricing_data
+
+    # 2. RequiredBaseRole 일괄 조회
+    cursor.execute(SQL_LOAD_REQUIRED_ROLES[filtered], params)
+    for combined_product_id, base_role, required_count in cursor:
+        pricing_data = pricing_by_id.get(combined_product_id)
         if pricing_data:
-            all_pricings.append(pricing_data)
-    
-    conn.close()
+            pricing_data["required_base_roles"].append(
+                {"base_role": base_role, "required_count": required_count}
+            )
+
+    # 3. 결합 가능한 요금제 일괄 조회 (상품별 요금 내림차순)
+    cursor.execute(SQL_LOAD_ELIGIBLE_PLANS[filtered], params)
+    for combined_product_id, name, fee, service_type, base_role in cursor:
+        pricing_data = pricing_by_id.get(combined_product_id)
+        plans_key = ASSOCIATED_PLANS_KEYS.get(service_type)
+        if pricing_data and plans_key:
+            pricing_data[plans_key].append(
+                {"name": name, "fee": fee, "service_type": service_type, "base_role": base_role}
+            )
+
     return all_pricings
 
 def classify_combined_product_discount_type(cursor, combined_product_id: str) -> str:
-    cursor.execute("""
-        SELECT COUNT(*) FROM Discount d
-        JOIN DiscountConditionByPlan p ON d.id = p.discount_id
-        WHERE d.combined_product_id = ?
-    """, (combined_product_id,))
-    has_plan = cursor.fetchone()[0] > 0
-
-    cursor.execute("""
-        SELECT COUNT(*) FROM Discount d
-        JOIN DiscountConditionByLineCount l ON d.id = l.discount_id
-        WHERE d.combined_product_id = ?
-    """, (combined_product_id,))
-    has_line = cursor.fetchone()[0] > 0
-
-    if has_plan and has_line:
-        return "mixed"
-    elif has_plan:
-        return "plan_based"
-    elif has_line:
-        return "line_based"
-    else:
-        return "none"
+    cursor.execute(SQL_COMBINED_PRODUCT_CONDITION_FLAGS, {"id": combined_product_id})
+    has_plan, has_line = cursor.fetchone()
+    return _discount_type_from_flags(has_plan, has_line, "none")
     
-def search_combined_product_combinations(
-    db_path: str,
-    *,
-    min_counts: Dict[str, int] = {},
-    max_counts: Dict[str, int] = {},
-    required_plan_names: List[str] = [],
-    required_combined_names: List[str] = [],
-    sort_by: str = "max_discount_amount",
-    limit: int = 10,
-    only_products: bool = False,
-    with_combinations: bool = False
-) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+def _iter_priced_combinations(
+    plans_by_type: Dict[str, List[Plan]],
+    plan_discounts: Dict[str, int],
+    min_counts: Dict[str, int],
+    max_counts: Dict[str, int],
+    required_plan_names: FrozenSet[str],
+) -> Iterator[Tuple[Tuple, int, int]]:
+    """(service_type별 부분 조합 묶음, 기본 요금 합, 할인액 합)을 전체 목록으로 만들지 않고 하나씩 생성합니다."""
+    # 조합을 요금제 목록 하나로 펼치는 것은 결과로 뽑힌 조합에 대해서만 함 (_flatten_combo_set)
+    # service_type별 부분 조합마다 요금 합/할인 합을 미리 계산해 두고,
+    # 전체 조합은 부분 조합의 합을 더하기만 함 (조합마다 요금제를 하나씩 다시 더하지 않음)
+    all_type_combinations = []
+    for service_type, plans in plans_by_type.items():
+        max_count = max_counts.get(service_type, 0)
+        min_count = min_counts.get(service_type, 0)
+        if min_count > max_count or (min_count > 0 and not plans):
+            # 이 service_type을 고를 방법이 없으면 이 상품은 조합이 하나도 없음 (나머지 service_type은 계산하지 않음)
+            return
+        if max_count == 0:
+            # 0개만 고를 수 있는 service_type은 빈 부분 조합 하나뿐이라 곱집합에서 빼도 조합/순서가 같음
+            continue
+        fees = [plan.fee for plan in plans]
+        discounts = [plan_discounts.get(plan.id, 0) for plan in plans]
+        service_type_combos = []
+        for r in range(min_count, max_count + 1):
+            for indexes in combinations_with_replacement(range(len(plans)), r):
+                service_type_combos.append((
+                    [plans[i] for i in indexes],
+                    sum(fees[i] for i in indexes),
+                    sum(discounts[i] for i in indexes),
+                ))
+        all_type_combinations.append(service_type_combos)
+
+    if required_plan_names:
+        # ➤ 조합에 required_plan_names 중 적어도 하나는 포함되어야 함
+        # 펼친 뒤 거르지 않고, 부분 조합마다 포함 여부를 미리 표시해 두고 곱집합을 만들면서 가지치기
+        required_flags = [
+            [not required_plan_names.isdisjoint(plan.name for plan in plans) for plans, _, _ in type_combos]
+            for type_combos in all_type_combinations
+        ]
+        for combo_set in _iter_required_product(all_type_combinations, required_flags, 0, (), False):
+            yield combo_set, sum(fee for _, fee, _ in combo_set), sum(discount for _, _, discount in combo_set)
+        return
+
+    # 요금 합/할인 합 목록도 같은 순서로 곱집합을 만들어 나란히 순회 (조합마다 파이썬 수준에서 부분 합을 꺼내지 않음)
+    fee_sums = [[fee for _, fee, _ in type_combos] for type_combos in all_type_combinations]
+    discount_sums = [[discount for _, _, discount in type_combos] for type_combos in all_type_combinations]
+    for combo_set, fee_parts, discount_parts in zip(
+        product(*all_type_combinations), product(*fee_sums), product(*discount_sums)
+    ):
+        yield combo_set, sum(fee_parts), sum(discount_parts)
+
+def _iter_required_product(
+    all_type_combinations: List[List[Tuple]],
+    required_flags: List[List[bool]],
+    index: int,
+    prefix: Tuple,
+    satisfied: bool,
+) -> Iterator[Tuple]:
+    """product(*all_type_combinations)와 같은 순서로, 필수 요금제가 든 부분 조합이 하나 이상 있는 조합만 생성합니다."""
+    if satisfied:
+        # 앞쪽 service_type에서 이미 필수 요금제를 채웠으면 나머지는 모두 통과
+        for rest in product(*all_type_combinations[index:]):
+            yield prefix + rest
+        return
+    if index == len(all_type_combinations) - 1:
+        # 마지막 service_type에서만 채울 수 있으므로 필수 요금제가 든 부분 조합만 붙임
+        for type_combo, required in zip(all_type_combinations[index], required_flags[index]):
+            if required:
+                yield prefix + (type_combo,)
+        return
+    if index == len(all_type_combinations):
+        return
+    for type_combo, required in zip(all_type_combinations[index], required_flags[index]):
+        yield from _iter_required_product(
+            all_type_combinations, required_flags, index + 1, prefix + (type_combo,), required
+        )
+
+def _flatten_combo_set(combo_set: Tuple) -> List[Dict[str, Any]]:
+    """service_type별 부분 조합 묶음을 요금제 dict 목록 하나로 펼칩니다."""
+    return [plan._asdict() for plans, _, _ in combo_set for plan in plans]
+
+SQL_SEARCH_PLAN_DISCOUNTS = "SELECT combined_product_id, service_plan_id, discount_amount FROM plan_discount"
+
+# 상품별로 따로 조회하던 때와 같은 순서가 되도록 service_plan_id 순으로 정렬, 조합에 쓰지 않는 service_type은 제외
+SQL_SEARCH_PLANS = """
+    SELECT cpe.combined_product_id, sp.id, sp.name, sp.fee, sp.service_type, cpe.base_role
+    FROM ServicePlan sp
+    JOIN CombinedProductEligibility cpe ON sp.id = cpe.service_plan_id
+    WHERE sp.service_type IN ('Mobile', 'Internet', 'TV')
+    ORDER BY cpe.combined_product_id, cpe.service_plan_id
+"""
+
+@functools.lru_cache(maxsize=32)
+def _get_cached_search_data(db_path: str, fingerprint: Tuple) -> Tuple:
+    # fingerprint는 캐시 키로만 쓰임 (DB가 바뀌면 키가 달라져 다시 조회)
+    with pooled_connection(db_path) as conn:
+        return _load_search_data(conn)
+
+def _load_search_data(conn: sqlite3.Connection) -> Tuple:
+    """검색에 필요한 (상품 목록, 상품별 요금제, 상품별 요금제 할인액, 상품별 할인 유형)을 일괄 조회합니다."""
+    # 조합×요금제 반복문에서 컬럼을 이름으로 찾지 않도록 sqlite3.Row 대신 기본 튜플 행을 그대로 언패킹해서 씀
     cursor = conn.cursor()
 
-    all_combined_products = get_all_combined_product_pricings(db_name)
+    # 요금제별 할인액 계산(정액은 그대로, 정률은 요금의 %를 원 단위 절사)을 SQL 뷰로 한 번에 처리
+    conn.execute(PLAN_DISCOUNT_VIEW_SQL)
 
-    total_results = []
+    # 상품별 조회를 매 execute마다 암묵적 트랜잭션으로 돌리지 않고, 전체를 하나의 읽기 트랜잭션으로 묶음
+    conn.execute("BEGIN")
 
-    for combined_product in all_combined_products:
-        combined_product_id = combined_product["combined_product_id"]
-        combined_product_name = combined_product["combined_product_name"]
-        if (combined_product_name not in required_combined_names) and required_combined_names:
-            continue
+    # 결합 상품 목록도 새 연결을 열지 않고 같은 연결·같은 스냅샷에서 읽음
+    products = [
+        (combined_product["combined_product_id"], combined_product["combined_product_name"])
+        for combined_product in _load_combined_product_pricings(conn)
+    ]
 
-        discount_type = classify_discount_type(cursor, combined_product_id)
-        # RequiredBaseRole ("SELECT sp.service_type, sp.name, sp.fee FROM ServicePlan sp WHERE company_id = ?", (company_id,)) // combined_product_id, base_role, required_count
-        cursor.execute("""
-            SELECT rbr.combined_product_id, rbr.base_role, rbr.required_count
-            FROM RequiredBaseRole rbr
-            WHERE combined_product_id = ?
-        """, (combined_product_id, ))
-        cursor.fetchall()
-        
-        plans_by_type: Dict[str, List[Dict[str, Any]]] = {
-            "Mobile": [], "Internet": [], "TV": []
-        }
-        cursor.execute("""
-            SELECT sp.id, sp.name, sp.fee, sp.service_type, cpe.base_role
-            FROM ServicePlan sp
-            JOIN CombinedProductEligibility cpe ON sp.id = cpe.service_plan_id
-            WHERE cpe.combined_product_id = ?
-        """, (combined_product_id,))
-        for row in cursor.fetchall():
-            service_type = row["service_type"]
-            if service_type in plans_by_type:
-                plan_info = dict(row) # sqlite3.Row 객체를 딕셔너리로 변환
-                plan_info['base_role'] = row['base_role'] # ➤ 'base_role' 컬럼 값을 딕셔너리에 추가
-                plans_by_type[service_type].append(plan_info)
+    # 모든 상품의 요금제별 할인액을 한 번에 읽어 {combined_product_id: {service_plan_id: 할인액}}으로 묶음
+    discounts_by_product: Dict[str, Dict[str, int]] = {}
+    cursor.execute(SQL_SEARCH_PLAN_DISCOUNTS)
+    for discount_product_id, plan_id, discount_amount in cursor:
+        discounts_by_product.setdefault(discount_product_id, {})[plan_id] = discount_amount
+
+    # 모든 상품의 결합 가능 요금제를 한 번에 읽어 {combined_product_id: {service_type: [요금제]}}로 묶음
+    plans_by_product: Dict[str, Dict[str, List[Plan]]] = {}
+    cursor.execute(SQL_SEARCH_PLANS)
+    for plan_product_id, plan_id, plan_name, fee, service_type, base_role in cursor:
+        product_plans = plans_by_product.get(plan_product_id)
+        if product_plans is None:
+            product_plans = plans_by_product[plan_product_id] = _empty_plans_by_type()
+        product_plans[service_type].append(Plan(plan_id, plan_name, fee, service_type, base_role))
+
+    discount_types = classify_discount_types(
+        cursor, [combined_product_id for combined_product_id, _ in products]
+    )
+
+    conn.commit()
+    return products, plans_by_product, discounts_by_product, discount_types
+
+def _iter_search_priced_combinations(
+    products: List[Tuple[str, str]],
+    plans_by_product: Dict[str, Dict[str, List[Plan]]],
+    discounts_by_product: Dict[str, Dict[str, int]],
+    min_counts: Dict[str, int],
+    max_counts: Dict[str, int],
+    required_plan_names: FrozenSet[str],
+    target_ids: Optional[Set[str]] = None,
+) -> Iterator[Tuple[str, Tuple, int, int]]:
+    """상품 순서대로 (상품 id, 부분 조합 묶음, 기본 요금 합, 할인액 합)을 하나씩 생성합니다."""
+    # 조합 수는 회선 수에 따라 곱으로 늘어나므로 그대로 heapq 선택에 흘려보낼 수 있게 하나씩 생성
+    for combined_product_id, _ in products:
+        # 결합 상품 이름 필터가 있으면 대상이 아닌 상품은 조합을 만들지 않음
+        if target_ids is not None and combined_product_id not in target_ids:
+            continue
+        plans_by_type = plans_by_product.get(combined_product_id) or _empty_plans_by_type()
+        plan_discounts = discounts_by_product.get(combined_product_id, {})
 
         # 필터: required_plan_names가 주어진 경우 해당 요금제를 포함하지 않는 상품은 건너뜀
         if required_plan_names:
-            all_plan_names = [plan["name"] for plans in plans_by_type.values() for plan in plans]
-            if not all(name in all_plan_names for name in required_plan_names):
+            all_plan_names = {plan.name for plans in plans_by_type.values() for plan in plans}
+            if not required_plan_names.issubset(all_plan_names):
                 continue
 
-        all_type_combinations = []
-        for service_type, plans in plans_by_type.items():
-            max_count = max_counts.get(service_type, 0)
-            min_count = min_counts.get(service_type, 0)
-            service_type_combos = []
-            for r in range(min_count, max_count + 1):
-                service_type_combos.extend(combinations_with_replacement(plans, r))
-            all_type_combinations.append(service_type_combos)
-
-        all_combinations = []
-        for combo_set in product(*all_type_combinations):
-            combined = []
-            for sublist in combo_set:
-                combined.extend(sublist)
-            all_combinations.append(combined)
-        
         #############할인액 계산 v1#############
-        for combo in all_combinations:
-            combo_plan_names = {plan["name"] for plan in combo}
-    
-            # ➤ 조합에 required_plan_names 중 적어도 하나는 포함되어야 함
-            if required_plan_names and not any(name in combo_plan_names for name in required_plan_names):
-                continue
+        for combo_set, total_fee, total_discount in _iter_priced_combinations(
+            plans_by_type, plan_discounts, min_counts, max_counts, required_plan_names
+        ):
 
-            total_fee = sum(plan["fee"] for plan in combo)
-
-            total_discount = 0
-            for plan in combo:
-                cursor.execute("""
-                    SELECT dcbp.override_discount_value, dcbp.override_unit, sp.fee
-                    FROM DiscountConditionByPlan dcbp
-                    JOIN ServicePlan sp ON sp.id = dcbp.service_plan_id
-                    WHERE dcbp.service_plan_id = ? AND dcbp.discount_id IN (
-                        SELECT id FROM Discount WHERE combined_product_id = ?
-                    )
-                """, (plan["id"], combined_product_id))
-                discounts = cursor.fetchall()
-                total_discount += sum(
-                    [row["override_discount_value"] if row["override_unit"] == "KRW" else int(row["fee"] * row["override_discount_value"] / 100) for row in discounts if row["override_discount_value"] is not None]
-                )
-            
         # #############할인액 계산 v2#############
         # for combo in all_combinations: # 모든 조합에 대해
         #     combo_plan_names = {plan["name"] for plan in combo} # 결합상품 이름 가져오기
@@ -271,34 +475,135 @@ def search_combined_product_combinations(
         #             [row["override_discount_value"] for row in discounts if row["override_discount_value"] is not None]
         #         )
 
-            final_price = total_fee - total_discount
-            result = {
-                "combined_product_name": combined_product_name,
-                "plans": combo,
-                "total_base_fee": total_fee,
-                "total_discount_amount": total_discount,
-                "final_price": final_price,
-                "discount_type": discount_type,
-                "combined_product_id": combined_product_id
-            }
-            total_results.append(result)
-
-    conn.close()
-
-    if sort_by == "max_discount_amount":
-        total_results.sort(key=lambda x: x["total_discount_amount"], reverse=True)
-    elif sort_by == "min_final_price":
-        total_results.sort(key=lambda x: x["final_price"])
-    elif sort_by == "max_total_base_fee":
-        total_results.sort(key=lambda x: x["total_base_fee"], reverse=True)
-
-    if only_products:
-        return list({r["combined_product_id"]: r for r in total_results}.values())[:limit]
-
-    if not with_combinations:
-        return total_results[:limit]
-
-    return total_results[:limit]
+            yield (combined_product_id, combo_set, total_fee, total_discount)
+
+# 검색 조건별로 캐시해 둘 조합 수의 상한 (넘으면 캐시하지 않고 검색마다 새로 생성)
+PRICED_COMBINATIONS_CACHE_LIMIT = 100_000
+
+@functools.lru_cache(maxsize=2)
+def _get_cached_priced_combinations(
+    db_path: str,
+    fingerprint: Tuple,
+    min_counts_key: Tuple[Tuple[str, int], ...],
+    max_counts_key: Tuple[Tuple[str, int], ...],
+    required_plan_names: FrozenSet[str],
+) -> Optional[Tuple[Tuple[str, Tuple, int, int], ...]]:
+    """상품 순서대로 (상품 id, 부분 조합 묶음, 기본 요금 합, 할인액 합)을 모아 두고, 상한을 넘으면 None을 반환합니다."""
+    # 정렬 기준/개수/상품 이름 필터만 다른 검색은 조합 생성과 가격 계산을 다시 하지 않고 이 결과를 재사용
+    # (dict 인자는 캐시 키로 쓸 수 있도록 정렬된 튜플로 받음. 최근 두 검색 조건만 보관)
+    products, plans_by_product, discounts_by_product, _ = _get_cached_search_data(db_path, fingerprint)
+    priced_combinations = tuple(itertools.islice(
+        _iter_search_priced_combinations(
+            products, plans_by_product, discounts_by_product,
+            dict(min_counts_key), dict(max_counts_key), required_plan_names
+        ),
+        PRICED_COMBINATIONS_CACHE_LIMIT + 1,
+    ))
+    if len(priced_combinations) > PRICED_COMBINATIONS_CACHE_LIMIT:
+        return None
+    return priced_combinations
+
+# 검색 정렬 기준: ((상품 id, 부분 조합 묶음, 기본 요금 합, 할인액 합)에 대한 정렬 키, 큰 값 우선 여부)
+SEARCH_SORT_KEYS: Dict[str, Tuple[Any, bool]] = {
+    "max_discount_amount": (lambda priced: priced[3], True),
+    "min_final_price": (lambda priced: priced[2] - priced[3], False),
+    "max_total_base_fee": (lambda priced: priced[2], True),
+}
+
+def search_combined_product_combinations(
+    db_path: str,
+    *,
+    min_counts: Optional[Dict[str, int]] = None,
+    max_counts: Optional[Dict[str, int]] = None,
+    required_plan_names: Optional[List[str]] = None,
+    required_combined_names: Optional[List[str]] = None,
+    sort_by: str = "max_discount_amount",
+    limit: int = 10,
+    only_products: bool = False,
+    with_combinations: bool = False
+) -> List[Dict[str, Any]]:
+    # 기본값을 가변 객체({}, [])로 두면 호출 간에 공유되므로 None으로 받고 여기서 새로 만듦
+    min_counts = min_counts or {}
+    max_counts = max_counts or {}
+    # 조합마다 반복되는 포함 여부 검사는 해시 조회로 처리
+    required_plan_names = frozenset(required_plan_names or ())
+    required_combined_names = required_combined_names or []
+
+    # 상품/요금제/할인액/할인 유형은 DB가 바뀌기 전까지 검색 조건과 무관하게 같으므로 한 번 읽은 것을 재사용
+    db_path, fingerprint = os.path.abspath(db_path), _db_fingerprint(db_path)
+    products, plans_by_product, discounts_by_product, discount_types = _get_cached_search_data(db_path, fingerprint)
+    product_names = dict(products)
+
+    priced_combinations = _get_cached_priced_combinations(
+        db_path,
+        fingerprint,
+        tuple(sorted(min_counts.items())),
+        tuple(sorted(max_counts.items())),
+        required_plan_names,
+    )
+
+    # 결합 상품 이름 필터를 통과한 상품의 조합만 남김
+    target_ids = None
+    if required_combined_names:
+        target_ids = {
+            combined_product_id
+            for combined_product_id, combined_product_name in products
+            if combined_product_name in required_combined_names
+        }
+    candidates: Any
+    if priced_combinations is None:
+        # 캐시 상한을 넘는 검색 조건은 모아 두지 않고 대상 상품의 조합만 바로 생성
+        candidates = _iter_search_priced_combinations(
+            products, plans_by_product, discounts_by_product,
+            min_counts, max_counts, required_plan_names, target_ids
+        )
+    elif target_ids is None:
+        candidates = priced_combinations
+    else:
+        candidates = (priced for priced in priced_combinations if priced[0] in target_ids)
+
+    sort_key = SEARCH_SORT_KEYS.get(sort_by)
+    if sort_key is None:
+        # 알 수 없는 정렬 기준이면 정렬하지 않고 생성 순서대로 (only_products면 상품별 첫 조합)
+        if only_products:
+            first_by_product: Dict[str, Tuple] = {}
+            for priced in candidates:
+                first_by_product.setdefault(priced[0], priced)
+            selected = list(first_by_product.values())[:limit]
+        else:
+            selected = list(itertools.islice(candidates, limit))
+    else:
+        key, descending = sort_key
+        # 상위 limit개만 필요하면 전체를 정렬하지 않고 heapq로 뽑음 (sorted(...)[:limit]와 동순위 순서까지 같음)
+        select_top = heapq.nlargest if descending else heapq.nsmallest
+        if only_products:
+            # 모든 조합을 모아 정렬한 뒤 중복을 지우지 않고, 순회하면서 상품별 최고 조합만 남김 (동순위면 먼저 나온 조합)
+            best_by_product: Dict[str, Tuple[Any, Tuple]] = {}
+            for priced in candidates:
+                priced_key = key(priced)
+                best = best_by_product.get(priced[0])
+                if best is None or (priced_key > best[0] if descending else priced_key < best[0]):
+                    best_by_product[priced[0]] = (priced_key, priced)
+            selected = [priced for _, priced in select_top(limit, best_by_product.values(), key=lambda x: x[0])]
+        else:
+            selected = select_top(limit, candidates, key=key)
+
+    # 결과 dict는 뽑힌 조합에 대해서만 만듦
+    results = [
+        {
+            "combined_product_name": product_names[combined_product_id],
+            "plans": _flatten_combo_set(combo_set),
+            "total_base_fee": total_fee,
+            "total_discount_amount": total_discount,
+            "final_price": total_fee - total_discount,
+            "discount_type": discount_types[combined_product_id],
+            "combined_product_id": combined_product_id
+        }
+        for combined_product_id, combo_set, total_fee, total_discount in selected
+    ]
+
+    # 요금제 dict는 결과를 만들 때 새로 생성하므로, 호출한 쪽에서 바꿔도 캐시가 오염되지 않음 (별도 복사 불필요)
+    return results
 
 # --- 테스트 실행 (main 블록은 실제 환경에 맞게 조정 필요) ---
 if __name__ == "__main__":
@@ -1,108 +1,110 @@
-import sqlite3
-import hashlib
+from db_common import txn
 
-def hash_id(text: str) -> str:
-    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+# 외래 키 조회/조인용 인덱스 (기본 키의 선두 컬럼이 아닌 것만)
+# idx_disc_cpid는 db_read.py가 만드는 인덱스와 같은 정의라 중복으로 생기지 않음
+INDEX_SQL_LIST = [
+    "CREATE INDEX IF NOT EXISTS idx_sp_company ON ServicePlan(company_id)",
+    "CREATE INDEX IF NOT EXISTS idx_disc_cpid ON Discount(combined_product_id, plan_id, discount_value)",
+    "CREATE INDEX IF NOT EXISTS idx_bene_disc ON Benefits(discount_id)",
+    "CREATE INDEX IF NOT EXISTS idx_cpsp_plan ON CombinedProductServicePlan(service_plan_id)",
+]
 
-# DB 연결
-conn = sqlite3.connect("combined_products.db")
-cursor = conn.cursor()
+def create_schema(db_name: str = "combined_products.db", verbose: bool = False):
+    """테이블을 만들고 통신사 목록을 채웁니다. (import 시에는 실행되지 않음)"""
+    # DB 연결 (테이블 생성과 통신사 입력을 한 연결, 한 트랜잭션에서 처리)
+    with txn(db_name) as cursor:
+        # Company(통신사) 테이블
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Company (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+        """)
 
-# Company(통신사) 테이블
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS Company (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL UNIQUE
-)
-""")
 
+        # ServicePlan 테이블
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ServicePlan (
+            id TEXT PRIMARY KEY,
+            company_id INTEGER,
+            name TEXT,
+            service_type TEXT CHECK(service_type IN ('mobile', 'internet', 'iptv')),
+            fee INTEGER,
+            FOREIGN KEY (company_id) REFERENCES Company(id)
+        )
+        """)
 
-# ServicePlan 테이블
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS ServicePlan (
-    id TEXT PRIMARY KEY,
-    company_id INTEGER,
-    name TEXT,
-    service_type TEXT CHECK(service_type IN ('mobile', 'internet', 'iptv')),
-    fee INTEGER,
-    FOREIGN KEY (company_id) REFERENCES Company(id)
-)
-""")
+        # CombinedProduct 테이블 (결합상품 메타 정보)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CombinedProduct (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            company_id INTEGER,
+            join_condition TEXT,
+            notice TEXT,
+            applicant_scope TEXT,
+            application_channel TEXT,
+            url TEXT,
+            summary TEXT,
+            available BOOLEAN,
+            FOREIGN KEY (company_id) REFERENCES Company(id)
+        )
+        """)
 
-# CombinedProduct 테이블 (결합상품 메타 정보)
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS CombinedProduct (
-    id TEXT PRIMARY KEY,
-    name TEXT NOT NULL,
-    company_id INTEGER,
-    join_condition TEXT,
-    notice TEXT,
-    applicant_scope TEXT,
-    application_channel TEXT,
-    url TEXT,
-    summary TEXT,
-    available BOOLEAN,
-    FOREIGN KEY (company_id) REFERENCES Company(id)
-)
-""")
+        # Discount 테이블
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Discount (
+            id TEXT PRIMARY KEY,
+            combined_product_id TEXT,
+            company_id INTEGER,
+            plan_id TEXT,
+            discount_type TEXT CHECK(discount_type IN ('amount', 'rate')),
+            discount_value INTEGER,
+            note TEXT,
+            FOREIGN KEY (combined_product_id) REFERENCES CombinedProduct(id),
+            FOREIGN KEY (company_id) REFERENCES Company(id),
+            FOREIGN KEY (plan_id) REFERENCES ServicePlan(id)
+        )
+        """)
 
-# Discount 테이블
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS Discount (
-    id TEXT PRIMARY KEY,
-    combined_product_id TEXT,
-    company_id INTEGER,
-    plan_id TEXT,
-    discount_type TEXT CHECK(discount_type IN ('amount', 'rate')),
-    discount_value INTEGER,
-    note TEXT,
-    FOREIGN KEY (combined_product_id) REFERENCES CombinedProduct(id),
-    FOREIGN KEY (company_id) REFERENCES Company(id),
-    FOREIGN KEY (plan_id) REFERENCES ServicePlan(id)
-)
-""")
+        # Benefits 테이블
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Benefits (
+            id TEXT PRIMARY KEY,
+            discount_id TEXT,
+            content TEXT,
+            FOREIGN KEY (discount_id) REFERENCES Discount(id)
+        )
+        """)
 
-# Benefits 테이블
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS Benefits (
-    id TEXT PRIMARY KEY,
-    discount_id TEXT,
-    content TEXT,
-    FOREIGN KEY (discount_id) REFERENCES Discount(id)
-)
-""")
+        # 연결 테이블: CombinedProduct - ServicePlan
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CombinedProductServicePlan (
+            combined_product_id TEXT,
+            service_plan_id TEXT,
+            PRIMARY KEY (combined_product_id, service_plan_id),
+            FOREIGN KEY (combined_product_id) REFERENCES CombinedProduct(id),
+            FOREIGN KEY (service_plan_id) REFERENCES ServicePlan(id)
+        )
+        """)
 
-# 연결 테이블: CombinedProduct - ServicePlan
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS CombinedProductServicePlan (
-    combined_product_id TEXT,
-    service_plan_id TEXT,
-    PRIMARY KEY (combined_product_id, service_plan_id),
-    FOREIGN KEY (combined_product_id) REFERENCES CombinedProduct(id),
-    FOREIGN KEY (service_plan_id) REFERENCES ServicePlan(id)
-)
-""")
+        for index_sql in INDEX_SQL_LIST:
+            cursor.execute(index_sql)
 
-# 커밋 및 종료
-conn.commit()
-conn.close()
+        companies = ["skt", "kt", "lguplus", "others"]
+        cursor.executemany("""
+            INSERT INTO Company (name)
+            VALUES (?)
+            ON CONFLICT(name) DO NOTHING
+        """, [(c_,) for c_ in companies])
 
-conn = sqlite3.connect("combined_products.db")
-cursor = conn.cursor()
+        # 확인용 출력은 verbose일 때만 (쓰기 경로에서 불필요한 조회를 하지 않음)
+        if verbose:
+            for row in cursor.execute("SELECT * FROM Company"):
+                print(row)
 
-companies = ["skt", "kt", "lguplus", "others"]
-for c_ in companies:
-    cursor.execute("""
-        INSERT INTO Company (name)
-        VALUES (?)
-        ON CONFLICT(name) DO NOTHING
-    """, (c_,))
-    
-cursor.execute("SELECT * FROM Company")
-rows = cursor.fetchall()
+        # 쿼리 플래너가 인덱스를 고르도록 통계 갱신 (블록이 끝나면 커밋 후 연결 종료)
+        cursor.execute("ANALYZE")
 
-for row in rows:
-    print(row)
-
-conn.commit()
-conn.close()
\ No newline at end of file
+if __name__ == "__main__":
+    create_schema(verbose=True)
@@ -1,7 +1,11 @@
 import sqlite3
-import hashlib
+
+from db_common import open_db, txn
 
 # 테이블별 SQL 문 정의 (create_combined_product_db의 일부 발췌)
+# 문자열 기본 키를 쓰는 좁은 테이블은 WITHOUT ROWID로 만들어 rowid를 거치는 두 번째 B-tree 조회를 없앰
+# (Company는 AUTOINCREMENT, RequiredBaseRole·DiscountConditionByPlan은 기본 키 컬럼(base_role 등)이 NULL을 허용하고,
+#  CombinedProduct·Benefits는 설명/URL/혜택 내용 같은 긴 텍스트가 들어가는 넓은 행이라 일반 rowid 테이블로 둠)
 table_sql_map = {
     "Company": """
         CREATE TABLE IF NOT EXISTS Company (
@@ -17,7 +21,7 @@ table_sql_map = {
             service_type TEXT NOT NULL,
             fee INTEGER NOT NULL,
             FOREIGN KEY (company_id) REFERENCES Company(id)
-        )
+        ) WITHOUT ROWID
     """,
     "CombinedProduct": """
         CREATE TABLE IF NOT EXISTS CombinedProduct (
@@ -55,7 +59,7 @@ table_sql_map = {
             PRIMARY KEY (combined_product_id, service_plan_id),
             FOREIGN KEY (combined_product_id) REFERENCES CombinedProduct(id),
             FOREIGN KEY (service_plan_id) REFERENCES ServicePlan(id)
-        )
+        ) WITHOUT ROWID
     """,
     "Discount": """
         CREATE TABLE IF NOT EXISTS Discount (
@@ -69,7 +73,7 @@ table_sql_map = {
             applies_to_line_sequence VARCHAR(64),
             note VARCHAR(256),
             FOREIGN KEY (combined_product_id) REFERENCES CombinedProduct(id)
-        )
+        ) WITHOUT ROWID
     """,
     "DiscountConditionByPlan": """
         CREATE TABLE IF NOT EXISTS DiscountConditionByPlan (
@@ -94,7 +98,7 @@ table_sql_map = {
             applies_per_line BOOLEAN DEFAULT TRUE,
             PRIMARY KEY (discount_id, min_applicable_lines),
             FOREIGN KEY (discount_id) REFERENCES Discount(id)
-        )
+        ) WITHOUT ROWID
     """,
     "Benefits": """
         CREATE TABLE IF NOT EXISTS Benefits (
@@ -108,8 +112,47 @@ table_sql_map = {
     """
 }
 
-def hash_id(text: str) -> str:
-    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+# 테이블별 인덱스 SQL 문 정의 (외래 키·조회 경로의 조인/필터 컬럼 중 기본 키의 선두 컬럼이 아닌 것만)
+# CombinedProductEligibility(combined_product_id), DiscountConditionByPlan(discount_id),
+# DiscountConditionByLineCount(discount_id)는 기본 키 인덱스로 이미 찾을 수 있음
+index_sql_map = {
+    "ServicePlan": [
+        "CREATE INDEX IF NOT EXISTS idx_sp_company ON ServicePlan(company_id)",
+    ],
+    "CombinedProduct": [
+        "CREATE INDEX IF NOT EXISTS idx_cp_company ON CombinedProduct(company_id)",
+    ],
+    "CombinedProductEligibility": [
+        "CREATE INDEX IF NOT EXISTS idx_cpe_sp ON CombinedProductEligibility(service_plan_id)",
+    ],
+    "Discount": [
+        "CREATE INDEX IF NOT EXISTS idx_disc_cp ON Discount(combined_product_id)",
+    ],
+    "DiscountConditionByPlan": [
+        "CREATE INDEX IF NOT EXISTS idx_dcbp_plan ON DiscountConditionByPlan(service_plan_id)",
+    ],
+    "Benefits": [
+        "CREATE INDEX IF NOT EXISTS idx_bene_cp ON Benefits(combined_product_id)",
+    ],
+}
+
+def create_indexes(cursor, table_names, index_sql_map=index_sql_map):
+    """전달된 테이블의 인덱스를 생성합니다. (테이블을 지우면 인덱스도 함께 지워지므로 재생성 시에도 호출)"""
+    for table_name in table_names:
+        for index_sql in index_sql_map.get(table_name, []):
+            cursor.execute(index_sql)
+
+def build_schema_script(table_sql_map=table_sql_map, index_sql_map=index_sql_map) -> str:
+    """테이블/인덱스 생성 SQL을 하나의 트랜잭션으로 묶은 스크립트를 만듭니다.
+    (인덱스 생성 후 ANALYZE로 통계를 갱신해 쿼리 플래너가 인덱스를 고르도록 함)"""
+    statements = [table_sql.strip() for table_sql in table_sql_map.values()]
+    statements += [
+        index_sql
+        for table_name in table_sql_map
+        for index_sql in index_sql_map.get(table_name, [])
+    ]
+    statements.append("ANALYZE")
+    return "BEGIN;\n" + ";\n".join(statements) + ";\nCOMMIT;"
 
 def create_combined_product_db(db_name="combined_products.db", table_sql_map=table_sql_map):
     """
@@ -118,141 +161,11 @@ def create_combined_product_db(db_name="combined_products.db", table_sql_map=tab
     """
     conn = None
     try:
-        conn = sqlite3.connect(db_name)
+        conn = open_db(db_name)
         cursor = conn.cursor()
 
-        # Company 테이블 생성
-        # cursor.execute("""
-        #     CREATE TABLE IF NOT EXISTS Company (
-        #         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        #         name VARCHAR(32) UNIQUE NOT NULL
-        #     )
-        # """)
-        cursor.execute(table_sql_map["Company"])
-
-        # ServicePlan 테이블 생성
-        # VARCHAR 대신 TEXT 타입 유지
-        # cursor.execute("""
-        #     CREATE TABLE IF NOT EXISTS ServicePlan (
-        #         id VARCHAR(64) PRIMARY KEY,
-        #         company_id INTEGER NOT NULL,
-        #         name TEXT NOT NULL,
-        #         service_type TEXT NOT NULL,
-        #         fee INTEGER NOT NULL,
-        #         FOREIGN KEY (company_id) REFERENCES Company(id)
-        #     )
-        # """)
-        cursor.execute(table_sql_map["ServicePlan"])
-
-        # CombinedProduct 테이블 생성
-        # VARCHAR 대신 TEXT 타입 유지 및 필드명/타입 반영
-        # cursor.execute("""
-        #     CREATE TABLE IF NOT EXISTS CombinedProduct (
-        #         id VARCHAR(64) PRIMARY KEY,
-        #         name TEXT NOT NULL,
-        #         company_id INTEGER NOT NULL,
-        #         description TEXT,
-        #         min_mobile_lines INTEGER DEFAULT 0,
-        #         min_internet_lines INTEGER DEFAULT 0,
-        #         min_iptv_lines INTEGER DEFAULT 0,
-        #         max_mobile_lines INTEGER,
-        #         max_internet_lines INTEGER,
-        #         max_iptv_lines INTEGER,
-        #         join_condition TEXT, -- 텍스트 기반의 기타 조건
-        #         applicant_scope TEXT,
-        #         application_channel TEXT,
-        #         url TEXT,
-        #         available BOOLEAN,
-        #         FOREIGN KEY (company_id) REFERENCES Company(id)
-        #     )
-        # """)
-        cursor.execute(table_sql_map["CombinedProduct"])
-
-        # CombinedProductEligibility 테이블 생성 (동일)
-        # cursor.execute("""
-        #     CREATE TABLE IF NOT EXISTS CombinedProductEligibility (
-        #         combined_product_id VARCHAR(64) NOT NULL,
-        #         service_plan_id VARCHAR(64) NOT NULL,
-        #         min_lines INTEGER DEFAULT 0,
-        #         max_lines INTEGER DEFAULT 1,
-        #         is_base_plan_required BOOLEAN DEFAULT FALSE,
-        #         PRIMARY KEY (combined_product_id, service_plan_id),
-        #         FOREIGN KEY (combined_product_id) REFERENCES CombinedProduct(id),
-        #         FOREIGN KEY (service_plan_id) REFERENCES ServicePlan(id)
-        #     )
-        # """)
-        cursor.execute(table_sql_map["CombinedProductEligibility"])
-
-        # Discount 테이블 생성 (업데이트: discount_name, applies_to_line_sequence 추가, condition 제거)
-        # cursor.execute("""
-        #     CREATE TABLE IF NOT EXISTS Discount (
-        #         id VARCHAR(64) PRIMARY KEY,
-        #         combined_product_id VARCHAR(64) NOT NULL,
-        #         discount_name VARCHAR(128), -- 할인의 구체적인 이름
-        #         discount_type VARCHAR(64) NOT NULL, -- 할인 유형 (Amount, Percentage)
-        #         discount_value INTEGER NOT NULL, -- 기본 할인 금액 또는 비율
-        #         unit VARCHAR(10) NOT NULL, -- 'KRW', '%'
-        #         applies_to_service_type VARCHAR(124), -- 적용 서비스 타입 (Mobile, Internet, TV)
-        #         applies_to_line_sequence VARCHAR(64), -- 적용 회선 순서 (All, 1st, 2nd_onwards, Nth_line)
-        #         note VARCHAR(256), -- 기타 참고사항
-        #         FOREIGN KEY (combined_product_id) REFERENCES CombinedProduct(id)
-        #     )
-        # """)
-        cursor.execute(table_sql_map["Discount"])
-
-        # DiscountConditionByPlan 테이블 생성 (요금제별 할인 조건)
-        # cursor.execute("""
-        #     CREATE TABLE IF NOT EXISTS DiscountConditionByPlan (
-        #         discount_id VARCHAR(64) NOT NULL,
-        #         service_plan_id VARCHAR(64) NOT NULL,
-        #         condition_text VARCHAR(256), -- 요금제 관련 추가 텍스트 조건 (예: "에센스 이상")
-        #         override_discount_value INTEGER, -- 특정 요금제 시 할인 값 재정의
-        #         override_unit VARCHAR(10), -- 재정의된 단위
-        #         PRIMARY KEY (discount_id, service_plan_id, base_role),
-        #         FOREIGN KEY (discount_id) REFERENCES Discount(id),
-        #         FOREIGN KEY (service_plan_id) REFERENCES ServicePlan(id)
-        #     )
-        # """)
-        cursor.execute(table_sql_map["DiscountConditionByPlan"])
-
-        # DiscountConditionByLineCount 테이블 생성 (회선 수별 할인 조건)
-        # cursor.execute("""
-        #     CREATE TABLE IF NOT EXISTS DiscountConditionByLineCount (
-        #         discount_id VARCHAR(64) NOT NULL,
-        #         min_applicable_lines INTEGER NOT NULL, -- 할인이 적용되는 최소 회선 번호 (예: 2)
-        #         max_applicable_lines INTEGER, -- 할인이 적용되는 최대 회선 번호 (NULL 가능)
-        #         override_discount_value INTEGER, -- 특정 회선 수 범위 시 할인 값 재정의
-        #         override_unit VARCHAR(10), -- 재정의된 단위
-        #         applies_per_line BOOLEAN DEFAULT TRUE, -- 각 회선에 개별 적용 여부 (TRUE/FALSE)
-        #         PRIMARY KEY (discount_id, min_applicable_lines),
-        #         FOREIGN KEY (discount_id) REFERENCES Discount(id)
-        #     )
-        # """)
-        cursor.execute(table_sql_map["DiscountConditionByLineCount"])
-
-        # Benefits 테이블 생성 (동일)
-        # cursor.execute("""
-        #     CREATE TABLE IF NOT EXISTS Benefits (
-        #         id VARCHAR(64) PRIMARY KEY,
-        #         combined_product_id VARCHAR(64) NOT NULL,
-        #         benefit_type VARCHAR(64),
-        #         content VARCHAR(256),
-        #         condition VARCHAR(256),
-        #         FOREIGN KEY (combined_product_id) REFERENCES CombinedProduct(id)
-        #     )
-        # """)
-        cursor.execute(table_sql_map["Benefits"])
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS RequiredBaseRole (
-                combined_product_id TEXT,
-                base_role TEXT,                  -- 예: 'main_mobile', 'main_internet'
-                required_count INTEGER NOT NULL, -- 예: 1
-                PRIMARY KEY (combined_product_id, base_role),
-                FOREIGN KEY (combined_product_id) REFERENCES CombinedProduct(id)
-            )
-        """)
-        cursor.execute(table_sql_map["RequiredBaseRole"])
+        # 테이블/인덱스 생성과 통계 갱신을 하나의 스크립트·트랜잭션으로 실행
+        cursor.executescript(build_schema_script(table_sql_map))
 
         conn.commit()
         print(f"데이터베이스 '{db_name}'와 테이블이 성공적으로 생성되었습니다.")
@@ -263,30 +176,24 @@ def create_combined_product_db(db_name="combined_products.db", table_sql_map=tab
         if conn:
             conn.close()
 
-def create_company_table(db_name="combined_products.db"):
-    conn = None
+def create_company_table(db_name="combined_products.db", verbose=False):
     try:
-        conn = sqlite3.connect(db_name)
-        cursor = conn.cursor()
-
-        companies = ["skt", "kt", "lguplus", "others"]
-        for c_ in companies:
-            cursor.execute("""
+        # 통신사 목록을 한 번의 executemany로 입력 (하나의 트랜잭션)
+        with txn(db_name) as cursor:
+            companies = ["skt", "kt", "lguplus", "others"]
+            cursor.executemany("""
                 INSERT INTO Company (name)
                 VALUES (?)
                 ON CONFLICT(name) DO NOTHING
-            """, (c_,))
-            
-        cursor.execute("SELECT * FROM Company")
-        rows = cursor.fetchall()
+            """, [(c_,) for c_ in companies])
 
-        for row in rows:
-            print(row)
+            # 확인용 출력은 verbose일 때만
+            if verbose:
+                cursor.execute("SELECT * FROM Company")
+                for row in cursor.fetchall():
+                    print(row)
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        conn.commit()
-        conn.close()
 
 def reset_selected_tables(table_names: list[str], db_name="combined_products.db", table_sql_map=table_sql_map):
     """
@@ -295,7 +202,7 @@ def reset_selected_tables(table_names: list[str], db_name="combined_products.db"
     """
     conn = None
     try:
-        conn = sqlite3.connect(db_name)
+        conn = open_db(db_name)
         cursor = conn.cursor()
 
         print("선택한 테이블 삭제 중...")
@@ -331,6 +238,7 @@ def reset_selected_tables(table_names: list[str], db_name="combined_products.db"
         # 생성
         for table in drop_order:
             create_table_if_selected(table_sql_map, table)
+        create_indexes(cursor, [table for table in drop_order if table in table_names])
 
         conn.commit()
 
@@ -344,4 +252,4 @@ def reset_selected_tables(table_names: list[str], db_name="combined_products.db"
 # 데이터베이스 생성 함수 호출
 if __name__ == "__main__":
     create_combined_product_db()
-    create_company_table()
+    create_company_table(verbose=True)
@@ -1,91 +1,103 @@
-import sqlite3
-import hashlib
-from typing import List, Tuple
-
-def hash_id(text: str) -> str:
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+from typing import Dict, List, Optional, Tuple
+
+from db_common import txn
+from hash_util import hash_id
+
+# === SQL 문 ===
+
+SQL_UPSERT_COMBINED_PRODUCT = """
+    INSERT INTO CombinedProduct (
+        id, name, company_id, join_condition, notice,
+        applicant_scope, application_channel, url, summary, available
+    ) VALUES (
+        :id, :name, :company_id, :join_condition, :notice,
+        :applicant_scope, :application_channel, :url, :summary, :available
+    )
+    ON CONFLICT(id) DO UPDATE SET
+        name=excluded.name,
+        company_id=excluded.company_id,
+        join_condition=excluded.join_condition,
+        notice=excluded.notice,
+        applicant_scope=excluded.applicant_scope,
+        application_channel=excluded.application_channel,
+        url=excluded.url,
+        summary=excluded.summary,
+        available=excluded.available
+"""
+
+SQL_UPSERT_SERVICE_PLAN = """
+    INSERT INTO ServicePlan (id, company_id, name, service_type, fee)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        fee=excluded.fee
+"""
+
+SQL_LINK_SERVICE_PLAN = """
+    INSERT OR IGNORE INTO CombinedProductServicePlan (combined_product_id, service_plan_id)
+    VALUES (?, ?)
+"""
+
+SQL_UPSERT_DISCOUNT = """
+    INSERT INTO Discount (
+        id, combined_product_id, company_id,
+        plan_id, discount_type, discount_value, note
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        discount_value=excluded.discount_value,
+        note=excluded.note
+"""
+
+# 상품의 첫 할인에 혜택을 연결 (할인이 없으면 SELECT 결과가 없어 아무것도 입력하지 않음)
+SQL_INSERT_BENEFIT = """
+    INSERT OR IGNORE INTO Benefits (id, discount_id, content)
+    SELECT ?, first_discount.id, ?
+    FROM (SELECT id FROM Discount WHERE combined_product_id = ? ORDER BY rowid LIMIT 1) AS first_discount
+"""
 
 # === UPSERT 함수들 ===
 
 def upsert_combined_product(cursor, product: dict):
-    cursor.execute("""
-        INSERT INTO CombinedProduct (
-            id, name, company_id, join_condition, notice,
-            applicant_scope, application_channel, url, summary, available
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(id) DO UPDATE SET
-            name=excluded.name,
-            company_id=excluded.company_id,
-            join_condition=excluded.join_condition,
-            notice=excluded.notice,
-            applicant_scope=excluded.applicant_scope,
-            application_channel=excluded.application_channel,
-            url=excluded.url,
-            summary=excluded.summary,
-            available=excluded.available
-    """, tuple(product.values()))
+    # 이름 있는 파라미터로 바인딩하므로 딕셔너리의 키 순서와 무관하게 컬럼에 맞게 들어감
+    cursor.execute(SQL_UPSERT_COMBINED_PRODUCT, product)
 
 def upsert_service_plans(cursor, company_id: int, plans: List[Tuple[str, str, int]]) -> List[str]:
-    plan_ids = []
-    for service_type, name, fee in plans:
-        plan_id = hash_id(f"{service_type}-{name}")
-        plan_ids.append((plan_id, service_type, name))
-        cursor.execute("""
-            INSERT INTO ServicePlan (id, company_id, name, service_type, fee)
-            VALUES (?, ?, ?, ?, ?)
-            ON CONFLICT(id) DO UPDATE SET
-                fee=excluded.fee
-        """, (plan_id, company_id, name, service_type, fee))
-    return plan_ids
+    # 파라미터 목록을 먼저 만들고 한 번의 executemany로 처리
+    params = [
+        (hash_id(f"{service_type}-{name}"), company_id, name, service_type, fee)
+        for service_type, name, fee in plans
+    ]
+    cursor.executemany(SQL_UPSERT_SERVICE_PLAN, params)
+    return [(plan_id, service_type, name) for plan_id, _, name, service_type, _ in params]
 
 def link_combined_product_service_plans(cursor, combined_product_id: str, plan_ids: List[str]):
-    for plan_id, _, _ in plan_ids:
-        cursor.execute("""
-            INSERT OR IGNORE INTO CombinedProductServicePlan (combined_product_id, service_plan_id)
-            VALUES (?, ?)
-        """, (combined_product_id, plan_id))
-
-def insert_discounts(cursor, combined_product_id: str, company_id: int, discount_data: List[Tuple[str, str, int]]):
-    for service_type, plan_name, discount_value in discount_data:
-        plan_id = hash_id(f"{service_type}-{plan_name}")
-        discount_id = hash_id(f"{combined_product_id}-{plan_name}")
-        cursor.execute("""
-            INSERT INTO Discount (
-                id, combined_product_id, company_id,
-                plan_id, discount_type, discount_value, note
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(id) DO UPDATE SET
-                discount_value=excluded.discount_value,
-                note=excluded.note
-        """, (
-            discount_id, combined_product_id, company_id,
-            plan_id, "amount", discount_value, f"{plan_name} 요금제의 요고뭉치 결합 할인"
-        ))
+    cursor.executemany(SQL_LINK_SERVICE_PLAN, [(combined_product_id, plan_id) for plan_id, _, _ in plan_ids])
+
+def insert_discounts(cursor, combined_product_id: str, company_id: int, discount_data: List[Tuple[str, str, int]],
+                     plan_id_by_key: Optional[Dict[Tuple[str, str], str]] = None):
+    # upsert_service_plans에서 이미 만든 요금제 id는 {(service_type, 요금제 이름): id}로 받아 다시 해시하지 않음
+    plan_id_by_key = plan_id_by_key or {}
+    cursor.executemany(SQL_UPSERT_DISCOUNT, [
+        (
+            hash_id(f"{combined_product_id}-{plan_name}"), combined_product_id, company_id,
+            plan_id_by_key.get((service_type, plan_name)) or hash_id(f"{service_type}-{plan_name}"),
+            "amount", discount_value, f"{plan_name} 요금제의 요고뭉치 결합 할인"
+        )
+        for service_type, plan_name, discount_value in discount_data
+    ])
 
 def insert_benefits(cursor, combined_product_id: str, benefits: List[str]):
-    cursor.execute("SELECT id FROM Discount WHERE combined_product_id = ? LIMIT 1", (combined_product_id,))
-    row = cursor.fetchone()
-    if not row:
-        return
-    first_discount_id = row[0]
-    for content in benefits:
-        benefit_id = hash_id(f"{combined_product_id}-{content}")
-        cursor.execute("""
-            INSERT OR IGNORE INTO Benefits (id, discount_id, content)
-            VALUES (?, ?, ?)
-        """, (benefit_id, first_discount_id, content))
+    # 첫 할인 id 조회와 혜택 입력을 하나의 INSERT ... SELECT로 처리
+    cursor.executemany(SQL_INSERT_BENEFIT, [
+        (hash_id(f"{combined_product_id}-{content}"), content, combined_product_id)
+        for content in benefits
+    ])
 
 # === 예시 데이터 및 실행 ===
 
 def insert_example_data():
-    conn = sqlite3.connect("combined_products.db")
-    cursor = conn.cursor()
-
     ## 문서를 보고 수집할 데이터 목록
     # 통신사 이름([skt, kt, lguplus] 중 하나, 아예 다른 회사면 others)
     company_name = "kt"
-    cursor.execute("SELECT id FROM Company WHERE name = ?", (company_name,))
-    company_id = cursor.fetchone()[0]
 
     # 결합상품 이름
     combined_product_name = "요고뭉치 결합"
@@ -112,7 +124,7 @@ def insert_example_data():
     product_data = {
         "id": product_id,
         "name": combined_product_name,
-        "company_id": company_id,
+        "company_id": None,  # 아래 트랜잭션에서 통신사 ID를 조회해 채움
         "join_condition": join_condition,
         "notice": notice,
         "applicant_scope": applicant_scope,
@@ -154,13 +166,19 @@ def insert_example_data():
         "신규 및 기존 고객 모두 신청 가능",
     ]
 
-    upsert_combined_product(cursor, product_data)
-    plan_ids = upsert_service_plans(cursor, company_id, service_plans)
-    link_combined_product_service_plans(cursor, product_id, plan_ids)
-    insert_discounts(cursor, product_id, company_id, discounts)
-    insert_benefits(cursor, product_id, benefits)
-
-    conn.commit()
-    conn.close()
-
-insert_example_data()
+    # 모든 UPSERT를 하나의 트랜잭션으로 묶음 (블록이 끝나면 한 번 커밋, 중간에 실패하면 전체 롤백)
+    with txn("combined_products.db") as cursor:
+        # 통신사 ID 조회도 같은 연결·트랜잭션에서 처리
+        cursor.execute("SELECT id FROM Company WHERE name = ?", (company_name,))
+        company_id = product_data["company_id"] = cursor.fetchone()[0]
+
+        upsert_combined_product(cursor, product_data)
+        plan_ids = upsert_service_plans(cursor, company_id, service_plans)
+        link_combined_product_service_plans(cursor, product_id, plan_ids)
+        plan_id_by_key = {(service_type, name): plan_id for plan_id, service_type, name in plan_ids}
+        insert_discounts(cursor, product_id, company_id, discounts, plan_id_by_key)
+        insert_benefits(cursor, product_id, benefits)
+
+# 실행 (import 시에는 예시 데이터를 입력하지 않음)
+if __name__ == "__main__":
+    insert_example_data()
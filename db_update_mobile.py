@@ -1,57 +1,70 @@
-import sqlite3
-import hashlib
 import csv
 import re
 
-def hash_id(text: str) -> str:
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+from db_common import open_db, txn
+from hash_util import hash_id
 
-def parse_fee(text: str) -> int:
-    """ '109,000' → 109000 """
-    text = text.replace(",", "").replace("원", "").strip()
-    return int(re.search(r'\d+', text).group()) if re.search(r'\d+', text) else 0
-
-def get_company_id(conn, name: str) -> int:
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM Company WHERE name = ?", (name.lower(),))
-    result = cursor.fetchone()
-    if result:
-        return result[0]
-    else:
-        cursor.execute("INSERT INTO Company (name) VALUES (?)", (name.lower(),))
-        conn.commit()
-        return cursor.lastrowid
-
-def upsert_service_plan_from_csv(csv_path: str, db_name: str = "combined_products.db"):
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+SQL_INSERT_COMPANY = "INSERT INTO Company (name) VALUES (?)"
 
-    with open(csv_path, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
+SQL_UPSERT_SERVICE_PLAN = """
+    INSERT OR REPLACE INTO ServicePlan (id, company_id, name, service_type, fee)
+    VALUES (?, ?, ?, ?, ?)
+"""
 
-        for row in reader:
-            company_name = row["통신사(SKT, KT, LGU)"].strip().lower()
-            product_name = row["상품명"].strip()
-            raw_fee = row["월 요금"].strip()
-            fee = parse_fee(raw_fee)
+# parse_fee가 행마다 쓰는 정규식/문자 제거표는 모듈 로드 시 한 번만 만듦
+_FEE_DIGITS_RE = re.compile(r'\d+')
+_FEE_STRIP_TABLE = str.maketrans("", "", ",원")
 
-            company_id = get_company_id(conn, company_name)
-            service_type = "Mobile"  # 현재 CSV는 모바일 요금제만 다루고 있음
-
-            plan_id = hash_id(f"{company_name}-{product_name}")
-
-            cursor.execute("""
-                INSERT OR REPLACE INTO ServicePlan (id, company_id, name, service_type, fee)
-                VALUES (?, ?, ?, ?, ?)
-            """, (plan_id, company_id, product_name, service_type, fee))
-
-            print(f"Upserted: {product_name} ({company_name}, {service_type}) → {fee}원")
+def parse_fee(text: str) -> int:
+    """ '109,000' → 109000 """
+    text = text.translate(_FEE_STRIP_TABLE).strip()
+    # 대부분은 숫자만 남으므로 정규식 없이 바로 변환
+    if text.isdecimal():
+        return int(text)
+    match = _FEE_DIGITS_RE.search(text)
+    return int(match.group()) if match else 0
 
-    conn.commit()
-    conn.close()
+def upsert_service_plan_from_csv(csv_path: str, db_name: str = "combined_products.db"):
+    service_type = "Mobile"  # 현재 CSV는 모바일 요금제만 다루고 있음
+    rows = []
+
+    # 행마다 커밋하지 않고 통신사 추가와 요금제 입력 전체를 하나의 트랜잭션으로 묶음
+    with txn(db_name) as cursor:
+        # 통신사 이름 → id를 한 번에 읽어 두고, 없는 통신사만 추가 (행마다 통신사를 조회하지 않음)
+        company_ids = dict(cursor.execute("SELECT name, id FROM Company").fetchall())
+
+        # CSV를 먼저 모두 읽어 파라미터 목록을 만들고, INSERT는 한 번의 executemany로 처리
+        with open(csv_path, newline='', encoding='utf-8') as csvfile:
+            # 행마다 dict를 만들지 않도록 헤더에서 열 위치를 한 번 찾고 위치로 꺼냄
+            reader = csv.reader(csvfile)
+            header = next(reader, [])
+            company_col = header.index("통신사(SKT, KT, LGU)")
+            product_col = header.index("상품명")
+            fee_col = header.index("월 요금")
+
+            for row in reader:
+                if not row:  # DictReader처럼 빈 줄은 건너뜀
+                    continue
+                company_name = row[company_col].strip().lower()
+                product_name = row[product_col].strip()
+                raw_fee = row[fee_col].strip()
+                fee = parse_fee(raw_fee)
+
+                company_id = company_ids.get(company_name)
+                if company_id is None:
+                    cursor.execute(SQL_INSERT_COMPANY, (company_name,))
+                    company_id = company_ids[company_name] = cursor.lastrowid
+
+                plan_id = hash_id(f"{company_name}-{product_name}")
+                rows.append((plan_id, company_id, product_name, service_type, fee))
+
+        cursor.executemany(SQL_UPSERT_SERVICE_PLAN, rows)
+
+    # 행마다 출력하지 않고 결과를 한 번만 출력
+    print(f"Upserted: {len(rows)}개 요금제 ({service_type})")
 
 def show_all_tables(db_name="combined_products.db"):
-    conn = sqlite3.connect(db_name)
+    conn = open_db(db_name)
     cursor = conn.cursor()
 
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
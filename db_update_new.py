@@ -1,12 +1,118 @@
+import logging
 import sqlite3
-import hashlib
 from typing import List, Tuple, Dict, Any
 
+from db_common import open_db, txn
 from db_schema_new import create_combined_product_db, create_company_table
-
-def hash_id(text: str) -> str:
-    """주어진 텍스트의 SHA256 해시 값을 반환하여 ID로 사용합니다."""
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+from hash_util import hash_id
+
+# 진행 메시지는 DEBUG로 남겨 기본 설정에서는 출력하지 않음 (행/단계마다 stdout에 쓰지 않음)
+log = logging.getLogger(__name__)
+
+# === SQL 문 ===
+
+# 통신사 ID와 그 통신사의 요금제를 한 번의 조회로 가져옴 (요금제가 없어도 통신사 행은 남도록 LEFT JOIN, 이때 요금제 컬럼은 NULL)
+SQL_SELECT_COMPANY_PLANS = """
+    SELECT c.id, sp.id, sp.service_type, sp.name, sp.fee
+    FROM Company c
+    LEFT JOIN ServicePlan sp ON sp.company_id = c.id
+    WHERE c.name = ?
+"""
+
+SQL_UPSERT_COMBINED_PRODUCT = """
+    INSERT INTO CombinedProduct (
+        id, name, company_id, description,
+        max_mobile_lines, max_internet_lines, max_iptv_lines, join_condition,
+        applicant_scope, application_channel, url, available
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        name=excluded.name,
+        company_id=excluded.company_id,
+        description=excluded.description,
+        max_mobile_lines=excluded.max_mobile_lines,
+        max_internet_lines=excluded.max_internet_lines,
+        max_iptv_lines=excluded.max_iptv_lines,
+        join_condition=excluded.join_condition,
+        applicant_scope=excluded.applicant_scope,
+        application_channel=excluded.application_channel,
+        url=excluded.url,
+        available=excluded.available
+"""
+
+SQL_UPSERT_SERVICE_PLAN = """
+    INSERT INTO ServicePlan (id, company_id, name, service_type, fee)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        name=excluded.name,
+        service_type=excluded.service_type,
+        fee=excluded.fee
+"""
+
+SQL_LINK_ELIGIBILITY = """
+    INSERT INTO CombinedProductEligibility (
+        combined_product_id, service_plan_id, min_lines, max_lines, base_role
+    ) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(combined_product_id, service_plan_id) DO UPDATE SET
+        min_lines=excluded.min_lines,
+        max_lines=excluded.max_lines,
+        base_role=excluded.base_role
+"""
+
+SQL_UPSERT_REQUIRED_BASE_ROLE = """
+    INSERT INTO RequiredBaseRole (combined_product_id, base_role, required_count)
+    VALUES (?, ?, ?)
+    ON CONFLICT(combined_product_id, base_role) DO UPDATE SET
+        required_count = excluded.required_count
+"""
+
+SQL_UPSERT_DISCOUNT = """
+    INSERT INTO Discount (
+        id, combined_product_id, discount_name, discount_type,
+        discount_value, unit, applies_to_service_type, applies_to_line_sequence, note
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        combined_product_id=excluded.combined_product_id,
+        discount_name=excluded.discount_name,
+        discount_type=excluded.discount_type,
+        discount_value=excluded.discount_value,
+        unit=excluded.unit,
+        applies_to_service_type=excluded.applies_to_service_type,
+        applies_to_line_sequence=excluded.applies_to_line_sequence,
+        note=excluded.note
+"""
+
+SQL_UPSERT_DISCOUNT_CONDITION_BY_PLAN = """
+    INSERT INTO DiscountConditionByPlan (
+        discount_id, service_plan_id, base_role, condition_text, override_discount_value, override_unit
+    ) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(discount_id, service_plan_id, base_role) DO UPDATE SET -- ON CONFLICT 조건에 base_role 추가
+        condition_text=excluded.condition_text,
+        override_discount_value=excluded.override_discount_value,
+        override_unit=excluded.override_unit
+"""
+
+SQL_UPSERT_DISCOUNT_CONDITION_BY_LINE_COUNT = """
+    INSERT INTO DiscountConditionByLineCount (
+        discount_id, min_applicable_lines, max_applicable_lines,
+        override_discount_value, override_unit, applies_per_line
+    ) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(discount_id, min_applicable_lines) DO UPDATE SET
+        max_applicable_lines=excluded.max_applicable_lines,
+        override_discount_value=excluded.override_discount_value,
+        override_unit=excluded.override_unit,
+        applies_per_line=excluded.applies_per_line
+"""
+
+SQL_UPSERT_BENEFIT = """
+    INSERT INTO Benefits (
+        id, combined_product_id, benefit_type, content, condition
+    ) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        combined_product_id=excluded.combined_product_id,
+        benefit_type=excluded.benefit_type,
+        content=excluded.content,
+        condition=excluded.condition
+"""
 
 # === UPSERT 함수들 ===
 
@@ -19,25 +125,7 @@ def upsert_combined_product(cursor: sqlite3.Cursor, product_data: Dict[str, Any]
     #       join_condition_text -> join_condition으로 스키마 통일
     # 변경2: min_mobile_lines, min_internet_lines, min_iptv_lines 삭제
 
-    cursor.execute("""
-        INSERT INTO CombinedProduct (
-            id, name, company_id, description,
-            max_mobile_lines, max_internet_lines, max_iptv_lines, join_condition,
-            applicant_scope, application_channel, url, available
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(id) DO UPDATE SET
-            name=excluded.name,
-            company_id=excluded.company_id,
-            description=excluded.description,
-            max_mobile_lines=excluded.max_mobile_lines,
-            max_internet_lines=excluded.max_internet_lines,
-            max_iptv_lines=excluded.max_iptv_lines,
-            join_condition=excluded.join_condition,
-            applicant_scope=excluded.applicant_scope,
-            application_channel=excluded.application_channel,
-            url=excluded.url,
-            available=excluded.available
-    """, (
+    cursor.execute(SQL_UPSERT_COMBINED_PRODUCT, (
         product_data['id'],
         product_data['name'],
         product_data['company_id'],
@@ -52,32 +140,29 @@ def upsert_combined_product(cursor: sqlite3.Cursor, product_data: Dict[str, Any]
         product_data.get('available')
     ))
 
-def upsert_service_plan(cursor: sqlite3.Cursor, company_id: int, service_type: str, name: str, fee: int) -> str:
-    """ServicePlan 테이블에 요금제 정보를 UPSERT하고, 해당 ID를 반환합니다."""
-    plan_id = hash_id(f"{company_id}_{service_type}_{name}")
-    cursor.execute("""
-        INSERT INTO ServicePlan (id, company_id, name, service_type, fee)
-        VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(id) DO UPDATE SET
-            name=excluded.name,
-            service_type=excluded.service_type,
-            fee=excluded.fee
-    """, (plan_id, company_id, name, service_type, fee))
-    return plan_id
-
-def link_combined_product_eligibility(cursor: sqlite3.Cursor, combined_product_id: str,
-                                      service_plan_id: str, min_lines: int = 0,
-                                      max_lines: int = 1, base_role: str = ""):
-    """CombinedProductEligibility 테이블에 결합상품-요금제 자격 정보를 UPSERT합니다."""
-    cursor.execute("""
-        INSERT INTO CombinedProductEligibility (
-            combined_product_id, service_plan_id, min_lines, max_lines, base_role
-        ) VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(combined_product_id, service_plan_id) DO UPDATE SET
-            min_lines=excluded.min_lines,
-            max_lines=excluded.max_lines,
-            base_role=excluded.base_role
-    """, (combined_product_id, service_plan_id, min_lines, max_lines, base_role))
+def plan_id_for(company_id: int, service_type: str, name: str) -> str:
+    """upsert_service_plans가 쓰는 규칙 그대로 요금제 ID를 계산합니다. (DB 조회 없이 같은 ID를 얻음)"""
+    return hash_id(f"{company_id}_{service_type}_{name}")
+
+def upsert_service_plans(cursor: sqlite3.Cursor, company_id: int,
+                         plans: List[Tuple[str, str, int]]) -> List[str]:
+    """ServicePlan 테이블에 (service_type, name, fee) 목록을 한 번의 executemany로 UPSERT하고, 입력 순서대로 ID를 반환합니다."""
+    plan_ids = [plan_id_for(company_id, service_type, name) for service_type, name, _fee in plans]
+    # 같은 요금제가 여러 번 들어오면(DB에서 읽은 요금제와 직접 정의한 요금제가 겹치는 등) ID별로 마지막 값만 UPSERT
+    # (ON CONFLICT로 차례로 덮어쓴 것과 결과가 같음)
+    rows = {
+        plan_id: (plan_id, company_id, name, service_type, fee)
+        for plan_id, (service_type, name, fee) in zip(plan_ids, plans)
+    }
+    cursor.executemany(SQL_UPSERT_SERVICE_PLAN, rows.values())
+    return plan_ids
+
+def link_combined_product_eligibilities(cursor: sqlite3.Cursor, combined_product_id: str,
+                                        eligibilities: List[Tuple[str, int, int, str]]):
+    """CombinedProductEligibility 테이블에 (service_plan_id, min_lines, max_lines, base_role) 목록을 한 번에 UPSERT합니다."""
+    # 충돌 키(요금제 ID)가 같은 행은 마지막 값만 보냄
+    rows = {eligibility[0]: (combined_product_id, *eligibility) for eligibility in eligibilities}
+    cursor.executemany(SQL_LINK_ELIGIBILITY, rows.values())
 
 def upsert_required_base_roles(cursor, combined_product_id: str, base_role_requirements: Dict[str, int]):
     """
@@ -88,33 +173,15 @@ def upsert_required_base_roles(cursor, combined_product_id: str, base_role_requi
     - combined_product_id: 결합 상품 ID
     - base_role_requirements: {"role명": 최소개수} 형태의 딕셔너리
     """
-    for base_role, required_count in base_role_requirements.items():
-        cursor.execute("""
-            INSERT INTO RequiredBaseRole (combined_product_id, base_role, required_count)
-            VALUES (?, ?, ?)
-            ON CONFLICT(combined_product_id, base_role) DO UPDATE SET
-                required_count = excluded.required_count
-        """, (combined_product_id, base_role, required_count))
-    print("RequiredBaseRole data updated/inserted.")
+    cursor.executemany(SQL_UPSERT_REQUIRED_BASE_ROLE, [
+        (combined_product_id, base_role, required_count)
+        for base_role, required_count in base_role_requirements.items()
+    ])
 
 def upsert_discount(cursor: sqlite3.Cursor, discount_data: Dict[str, Any]) -> str:
     """Discount 테이블에 할인 정보를 UPSERT하고, 해당 ID를 반환합니다."""
     discount_id = discount_data['id']
-    cursor.execute("""
-        INSERT INTO Discount (
-            id, combined_product_id, discount_name, discount_type,
-            discount_value, unit, applies_to_service_type, applies_to_line_sequence, note
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(id) DO UPDATE SET
-            combined_product_id=excluded.combined_product_id,
-            discount_name=excluded.discount_name,
-            discount_type=excluded.discount_type,
-            discount_value=excluded.discount_value,
-            unit=excluded.unit,
-            applies_to_service_type=excluded.applies_to_service_type,
-            applies_to_line_sequence=excluded.applies_to_line_sequence,
-            note=excluded.note
-    """, (
+    cursor.execute(SQL_UPSERT_DISCOUNT, (
         discount_id,
         discount_data['combined_product_id'],
         discount_data.get('discount_name'),
@@ -127,188 +194,173 @@ def upsert_discount(cursor: sqlite3.Cursor, discount_data: Dict[str, Any]) -> st
     ))
     return discount_id
 
-def upsert_discount_condition_by_plan(cursor: sqlite3.Cursor, discount_id: str, service_plan_id: str,
-                                      base_role: str = "", condition_text: str = None, 
-                                      override_discount_value: int = None, override_unit: str = None):
-    """DiscountConditionByPlan 테이블에 요금제별 할인 조건을 UPSERT합니다."""
-    cursor.execute("""
-        INSERT INTO DiscountConditionByPlan (
-            discount_id, service_plan_id, base_role, condition_text, override_discount_value, override_unit
-        ) VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(discount_id, service_plan_id, base_role) DO UPDATE SET -- ON CONFLICT 조건에 base_role 추가
-            condition_text=excluded.condition_text,
-            override_discount_value=excluded.override_discount_value,
-            override_unit=excluded.override_unit
-    """, (discount_id, service_plan_id, base_role, condition_text, override_discount_value, override_unit))
+def upsert_discount_conditions_by_plan(cursor: sqlite3.Cursor, discount_id: str,
+                                       conditions: List[Tuple[str, str, str, int, str]]):
+    """DiscountConditionByPlan 테이블에 요금제별 할인 조건 목록을 한 번에 UPSERT합니다.
+    (conditions: (service_plan_id, base_role, condition_text, override_discount_value, override_unit) 목록)"""
+    # 충돌 키(요금제 ID, base_role)가 같은 행은 마지막 값만 보냄
+    rows = {(condition[0], condition[1]): (discount_id, *condition) for condition in conditions}
+    cursor.executemany(SQL_UPSERT_DISCOUNT_CONDITION_BY_PLAN, rows.values())
 
 def upsert_discount_condition_by_line_count(cursor: sqlite3.Cursor, discount_id: str, min_applicable_lines: int,
                                             max_applicable_lines: int = None, override_discount_value: int = None,
                                             override_unit: str = None, applies_per_line: bool = True):
     """DiscountConditionByLineCount 테이블에 회선 수별 할인 조건을 UPSERT합니다."""
-    cursor.execute("""
-        INSERT INTO DiscountConditionByLineCount (
-            discount_id, min_applicable_lines, max_applicable_lines,
-            override_discount_value, override_unit, applies_per_line
-        ) VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(discount_id, min_applicable_lines) DO UPDATE SET
-            max_applicable_lines=excluded.max_applicable_lines,
-            override_discount_value=excluded.override_discount_value,
-            override_unit=excluded.override_unit,
-            applies_per_line=excluded.applies_per_line
-    """, (discount_id, min_applicable_lines, max_applicable_lines,
-          override_discount_value, override_unit, applies_per_line))
-
-def upsert_benefit(cursor: sqlite3.Cursor, combined_product_id: str, benefit_data: Dict[str, Any]):
-    """Benefits 테이블에 혜택 정보를 UPSERT합니다."""
-    benefit_id = benefit_data['id']
-    cursor.execute("""
-        INSERT INTO Benefits (
-            id, combined_product_id, benefit_type, content, condition
-        ) VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(id) DO UPDATE SET
-            combined_product_id=excluded.combined_product_id,
-            benefit_type=excluded.benefit_type,
-            content=excluded.content,
-            condition=excluded.condition
-    """, (
-        benefit_id,
-        combined_product_id,
-        benefit_data.get('benefit_type'),
-        benefit_data['content'],
-        benefit_data.get('condition')
+    cursor.execute(SQL_UPSERT_DISCOUNT_CONDITION_BY_LINE_COUNT, (
+        discount_id, min_applicable_lines, max_applicable_lines,
+        override_discount_value, override_unit, applies_per_line
     ))
 
+def upsert_benefits(cursor: sqlite3.Cursor, combined_product_id: str, benefits_data: List[Dict[str, Any]]):
+    """Benefits 테이블에 혜택 정보 목록을 한 번의 executemany로 UPSERT합니다."""
+    # 같은 ID의 혜택은 마지막 값만 보냄
+    rows = {
+        benefit_data['id']: (
+            benefit_data['id'],
+            combined_product_id,
+            benefit_data.get('benefit_type'),
+            benefit_data['content'],
+            benefit_data.get('condition')
+        )
+        for benefit_data in benefits_data
+    }
+    cursor.executemany(SQL_UPSERT_BENEFIT, rows.values())
+
 # === 예시 데이터 및 실행 ===
 
 def insert_example_data_v2(db_name="combined_products.db", **kwargs):
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id FROM Company WHERE name = ?", (company_name,))
-    company_id = cursor.fetchone()[0]
-
-    product_id = None
-    if 'combined_product_data' in kwargs:
-        product_data = kwargs['combined_product_data']
-        if 'company_id' not in product_data and company_id:
-            product_data['company_id'] = company_id
-        elif 'company_id' not in product_data:
-            print("Error: combined_product_data provided but no company_id or default company could be determined.")
-            conn.close()
-            return
+    # 공통 PRAGMA를 적용한 연결에서 모든 UPSERT를 하나의 트랜잭션으로 묶음
+    # (먼저 읽고 나중에 쓰므로 시작할 때 쓰기 잠금을 잡고, 예외가 나면 롤백하고 연결을 닫음)
+    with txn(db_name, immediate=True) as cursor:
+        # 통신사 ID와 요금제 이름 → ID를 한 번에 읽어 둠 (자격/할인 조건 루프에서 요금제마다 조회하지 않음)
+        company_plan_rows = cursor.execute(SQL_SELECT_COMPANY_PLANS, (company_name,)).fetchall()
+        company_id = company_plan_rows[0][0]
+        # 같은 이름의 요금제가 여러 개면(CSV로 들어간 요금제와 upsert_service_plans의 요금제 등)
+        # plan_id_for 규칙으로 만든 ID를 우선하고, 그래도 여럿이면 가장 작은 ID를 씀 (조회 순서와 무관하게 같은 결과)
+        plan_rank_by_name = {}
+        for _company_id, plan_id, service_type, name, _fee in company_plan_rows:
+            if plan_id is None:
+                continue
+            rank = (plan_id != plan_id_for(company_id, service_type, name), plan_id)
+            if name not in plan_rank_by_name or rank < plan_rank_by_name[name]:
+                plan_rank_by_name[name] = rank
+        db_plan_ids = {name: plan_id for name, (_not_rule_id, plan_id) in plan_rank_by_name.items()}
+        # plan_id_for로 계산한 ID가 실제로 있는 요금제인지 확인하는 용도 (이번에 입력한 요금제 ID는 아래에서 추가)
+        known_plan_ids = {
+            plan_id for _company_id, plan_id, _service_type, _name, _fee in company_plan_rows if plan_id is not None
+        }
+
+        product_id = None
+        if 'combined_product_data' in kwargs:
+            product_data = kwargs['combined_product_data']
+            if 'company_id' not in product_data and company_id:
+                product_data['company_id'] = company_id
+            elif 'company_id' not in product_data:
+                log.error("combined_product_data provided but no company_id or default company could be determined.")
+                return
         
-        product_id = product_data['id'] # combined_product_data가 있으면 id는 필수로 가정
-        upsert_combined_product(cursor, product_data)
-        print(f"CombinedProduct '{product_data['name']}' updated/inserted.")
-
-    service_plan_map = {}
-    if 'service_plan_definitions' in kwargs and company_id:
-        for service_type, name, fee in kwargs['service_plan_definitions']:
-            plan_id = upsert_service_plan(cursor, company_id, service_type, name, fee)
-            service_plan_map[name] = plan_id
-        print("ServicePlan data updated/inserted.")
-
-    elif 'service_plan_definitions' in kwargs and not company_id:
-         print("Error: service_plan_definitions provided but no company_id or default company could be determined.")
-
-    if 'eligibility_data' in kwargs and product_id:
-        if not service_plan_map:
-            cursor.execute("SELECT name, id FROM ServicePlan WHERE company_id = ?", (company_id,))
-            for name, plan_id in cursor.fetchall():
+            product_id = product_data['id'] # combined_product_data가 있으면 id는 필수로 가정
+            upsert_combined_product(cursor, product_data)
+            log.debug("CombinedProduct '%s' updated/inserted.", product_data['name'])
+
+        service_plan_map = {}
+        if 'service_plan_definitions' in kwargs and company_id:
+            service_plan_definitions = kwargs['service_plan_definitions']
+            plan_ids = upsert_service_plans(cursor, company_id, service_plan_definitions)
+            for (_service_type, name, _fee), plan_id in zip(service_plan_definitions, plan_ids):
                 service_plan_map[name] = plan_id
+            known_plan_ids.update(plan_ids)
+            log.debug("ServicePlan data updated/inserted.")
 
-        for entry in kwargs['eligibility_data']:
-            plan_name = entry['plan_name']
-            plan_id = service_plan_map.get(plan_name)
-
-            # service_plan_map에 없으면 DB에서 직접 조회 시도
-            if not plan_id:
-                cursor.execute("SELECT id FROM ServicePlan WHERE name = ? AND company_id = ?", (plan_name, company_id))
-                result = cursor.fetchone()
-                if result:
-                    plan_id = result[0]
-                    service_plan_map[plan_name] = plan_id  # 캐시에 저장
-                else:
-                    print(f"Warning: Service plan '{plan_name}' not found in DB. Skipping.")
-                    continue
+        elif 'service_plan_definitions' in kwargs and not company_id:
+            log.error("service_plan_definitions provided but no company_id or default company could be determined.")
 
-            link_combined_product_eligibility(
-                cursor, product_id, plan_id,
-                entry.get('min_lines', 0),
-                entry.get('max_lines', 1),
-                entry.get('base_role', "")  # 수정: is_base_plan_required → base_role
-            )
-        print("CombinedProductEligibility data updated/inserted.")
-
-    if 'required_base_roles' in kwargs and product_id:
-        upsert_required_base_roles(cursor, product_id, kwargs['required_base_roles'])
-        print("RequiredBaseRole data updated/inserted.")
-
-    if 'discount_data' in kwargs and product_id:
-        discount_data = kwargs['discount_data']
-        if 'combined_product_id' not in discount_data:
-            discount_data['combined_product_id'] = product_id
-        upsert_discount(cursor, discount_data)
-        discount_id = discount_data['id']
-        print(f"Discount '{discount_data.get('discount_name')}' updated/inserted.")
-
-        if 'discount_conditions_by_plan' in kwargs:
-            # service_plan_map 비어 있으면 DB에서 먼저 채우기
-            if not service_plan_map:
-                cursor.execute("SELECT name, id FROM ServicePlan WHERE company_id = ?", (company_id,))
-                for name, plan_id in cursor.fetchall():
-                    service_plan_map[name] = plan_id
-            
-            for entry in kwargs['discount_conditions_by_plan']:
+        if 'eligibility_data' in kwargs and product_id:
+            # 요금제 ID를 찾으며 행 목록만 만들고, INSERT는 루프가 끝난 뒤 한 번에 처리
+            eligibility_rows = []
+            for entry in kwargs['eligibility_data']:
                 plan_name = entry['plan_name']
-                plan_id = service_plan_map.get(plan_name)
-                base_role = entry.get("base_role", "")
-
-                # 캐시에 없다면 DB에서 직접 조회
+                if 'service_type' in entry:
+                    # 요금제 종류가 주어지면 ID를 바로 계산 (이름으로 찾지 않음), 없는 요금제면 건너뜀
+                    plan_id = plan_id_for(company_id, entry['service_type'], plan_name)
+                    if plan_id not in known_plan_ids:
+                        plan_id = None
+                else:
+                    # 이번에 입력한 요금제를 먼저 찾고, 없으면 미리 읽어 둔 DB 요금제에서 찾음
+                    plan_id = service_plan_map.get(plan_name) or db_plan_ids.get(plan_name)
                 if not plan_id:
-                    cursor.execute("SELECT id FROM ServicePlan WHERE name = ? AND company_id = ?", (plan_name, company_id))
-                    result = cursor.fetchone()
-                    if result:
-                        plan_id = result[0]
-                        service_plan_map[plan_name] = plan_id  # 캐시 갱신
+                    log.warning("Service plan '%s' not found in DB. Skipping.", plan_name)
+                    continue
+
+                eligibility_rows.append((
+                    plan_id,
+                    entry.get('min_lines', 0),
+                    entry.get('max_lines', 1),
+                    entry.get('base_role', "")  # 수정: is_base_plan_required → base_role
+                ))
+            link_combined_product_eligibilities(cursor, product_id, eligibility_rows)
+            log.debug("CombinedProductEligibility data updated/inserted.")
+
+        if 'required_base_roles' in kwargs and product_id:
+            upsert_required_base_roles(cursor, product_id, kwargs['required_base_roles'])
+            log.debug("RequiredBaseRole data updated/inserted.")
+
+        if 'discount_data' in kwargs and product_id:
+            discount_data = kwargs['discount_data']
+            if 'combined_product_id' not in discount_data:
+                discount_data['combined_product_id'] = product_id
+            upsert_discount(cursor, discount_data)
+            discount_id = discount_data['id']
+            log.debug("Discount '%s' updated/inserted.", discount_data.get('discount_name'))
+
+            if 'discount_conditions_by_plan' in kwargs:
+                condition_rows = []
+                for entry in kwargs['discount_conditions_by_plan']:
+                    plan_name = entry['plan_name']
+                    if 'service_type' in entry:
+                        plan_id = plan_id_for(company_id, entry['service_type'], plan_name)
+                        if plan_id not in known_plan_ids:
+                            plan_id = None
                     else:
-                        print(f"Warning: Service plan '{plan_name}' not found for discount condition by plan. Skipping.")
+                        plan_id = service_plan_map.get(plan_name) or db_plan_ids.get(plan_name)
+                    base_role = entry.get("base_role", "")
+                    if not plan_id:
+                        log.warning("Service plan '%s' not found for discount condition by plan. Skipping.", plan_name)
                         continue
 
-                upsert_discount_condition_by_plan(
-                    cursor,
-                    discount_id,
-                    plan_id,
-                    base_role,
-                    condition_text=entry.get('condition_text'),
-                    override_discount_value=entry.get('override_value'),
-                    override_unit=entry.get('override_unit')
+                    condition_rows.append((
+                        plan_id,
+                        base_role,
+                        entry.get('condition_text'),
+                        entry.get('override_value'),
+                        entry.get('override_unit')
+                    ))
+                upsert_discount_conditions_by_plan(cursor, discount_id, condition_rows)
+
+                log.debug("DiscountConditionByPlan data updated/inserted.")
+
+            if 'discount_conditions_by_line_count' in kwargs:
+                upsert_discount_condition_by_line_count(
+                    cursor, discount_id,
+                    min_applicable_lines=kwargs['discount_conditions_by_line_count']['min_applicable_lines'],
+                    max_applicable_lines=kwargs['discount_conditions_by_line_count'].get('max_applicable_lines'),
+                    override_discount_value=kwargs['discount_conditions_by_line_count'].get('override_discount_value'),
+                    override_unit=kwargs['discount_conditions_by_line_count'].get('override_unit'),
+                    applies_per_line=kwargs['discount_conditions_by_line_count'].get('applies_per_line', True)
                 )
+                log.debug("DiscountConditionByLineCount data updated/inserted.")
 
-            print("DiscountConditionByPlan data updated/inserted.")
-
-        if 'discount_conditions_by_line_count' in kwargs:
-            upsert_discount_condition_by_line_count(
-                cursor, discount_id,
-                min_applicable_lines=kwargs['discount_conditions_by_line_count']['min_applicable_lines'],
-                max_applicable_lines=kwargs['discount_conditions_by_line_count'].get('max_applicable_lines'),
-                override_discount_value=kwargs['discount_conditions_by_line_count'].get('override_discount_value'),
-                override_unit=kwargs['discount_conditions_by_line_count'].get('override_unit'),
-                applies_per_line=kwargs['discount_conditions_by_line_count'].get('applies_per_line', True)
-            )
-            print("DiscountConditionByLineCount data updated/inserted.")
-
-    if 'benefits_data' in kwargs and product_id:
-        for benefit in kwargs['benefits_data']:
-            upsert_benefit(cursor, product_id, benefit)
-        print("Benefits data updated/inserted.")
-
-    conn.commit()
-    conn.close()
-    print("데이터 업데이트/삽입 완료.")
+        if 'benefits_data' in kwargs and product_id:
+            upsert_benefits(cursor, product_id, kwargs['benefits_data'])
+            log.debug("Benefits data updated/inserted.")
+
+    log.info("데이터 업데이트/삽입 완료.")
 
 # 데이터베이스 스키마 생성 및 예시 데이터 삽입 실행
 if __name__ == "__main__":
+    # 완료 메시지와 경고만 출력 (진행 메시지를 보려면 level=logging.DEBUG)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     # 데이터베이스 스키마 생성
     db_name = "combined_products.db"
     create_combined_product_db("combined_products.db")
@@ -1185,14 +1237,16 @@ if __name__ == "__main__":
     combined_product_name = "프리미엄 싱글결합"
     product_id = hash_id(f"{company_name}_{combined_product_name}")
 
-    # 회사 ID 조회
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM Company WHERE name = ?", (company_name,))
-    company_id = cursor.fetchone()[0]
-    cursor.execute("SELECT service_type, name, fee FROM ServicePlan WHERE company_id = ?", (company_id,))
-    mobile_all = cursor.fetchall()
+    # 회사 ID와 요금제 목록 조회 (한 번의 JOIN 조회)
+    conn = open_db(db_name)
+    company_plan_rows = conn.execute(SQL_SELECT_COMPANY_PLANS, (company_name,)).fetchall()
     conn.close()
+    company_id = company_plan_rows[0][0]
+    mobile_all = [
+        (service_type, name, fee)
+        for _company_id, plan_id, service_type, name, fee in company_plan_rows
+        if plan_id is not None
+    ]
 
     # 2. CombinedProduct 정보
     premium_single_combined_product_data = {
@@ -1223,6 +1277,7 @@ if __name__ == "__main__":
     premium_single_eligibility_data = [
         {
             "plan_name": plan[1],
+            "service_type": plan[0],  # 요금제 ID를 이름 조회 없이 계산하도록 종류도 함께 전달
             "min_lines": 1,
             "max_lines": 1,
             "base_role": "main_mobile"
@@ -1237,6 +1292,7 @@ if __name__ == "__main__":
     for internet_plan in ["인터넷 베이직", "인터넷 베이직 와이파이", "인터넷 에센스", "인터넷 에센스 와이파이",]:
         premium_single_eligibility_data.append({
             "plan_name": internet_plan,
+            "service_type": "Internet",
             "min_lines": 1,
             "max_lines": 1,
             "base_role": "main_internet"
@@ -1279,6 +1335,7 @@ if __name__ == "__main__":
         premium_single_discount_by_plan_conditions.append(
             {
                 "plan_name": plan_name,
+                "service_type": plan[0],
                 "base_role": "main_mobile",
                 "condition_text": "",
                 "override_value": discount_value,  # 예시 할인액 (PDF에 정확한 금액 명시되지 않음)
@@ -0,0 +1,9 @@
+import functools
+import hashlib
+
+# 같은 문자열의 id를 여러 번 만드는 경우가 많아(요금제 id를 할인 입력에서 다시 만드는 등) 결과를 캐시
+@functools.lru_cache(maxsize=65536)
+def hash_id(text: str) -> str:
+    """주어진 텍스트의 SHA256 해시 값을 반환하여 ID로 사용합니다."""
+    # 보안 용도가 아니라 키 생성용이므로 usedforsecurity=False (FIPS 모드에서도 막히지 않음, 결과는 동일)
+    return hashlib.sha256(text.encode("utf-8"), usedforsecurity=False).hexdigest()